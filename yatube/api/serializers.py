@@ -0,0 +1,47 @@
+"""Компактные представления моделей для JSON API: только нужные поля."""
+from posts.models import FEED_FIELDS
+
+POST_FIELDS = FEED_FIELDS + ('comments_count',)
+COMMENT_FIELDS = ('id', 'text', 'created', 'post', 'author',
+                  'author__id', 'author__username')
+
+
+def post_data(post):
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.id,
+        'post': comment.post_id,
+        'author': comment.author.username if comment.author else None,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def profile_data(author, stats, following):
+    return {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+        'following': following,
+    }
+
+
+def page_data(page, serialize):
+    return {
+        'results': [serialize(obj) for obj in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
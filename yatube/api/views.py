@@ -0,0 +1,238 @@
+"""
+JSON API поверх тех же моделей и форм, что и HTML-страницы.
+
+Списки отдаются курсорными страницами (?cursor=, ?limit=). ETag списков
+строится, как у HTML-страниц, из версий областей кеша
+(posts.conditional): правка, удаление, подписка или новый комментарий
+меняют его, и клиент получает 304 без тела, только пока список
+действительно прежний.
+
+Запись идёт по сессии с csrf-токеном в заголовке X-CSRFToken; отказ
+CSRF приходит, как и остальные ошибки, в JSON (core.views.csrf_failure).
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.http.multipartparser import MultiPartParserError
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+from posts import thumbnails
+from posts.cache import (GLOBAL_SCOPE, author_scope, follow_feed_scope,
+                         group_scope, post_scope)
+from posts.conditional import versioned_page
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginator import COMMENT_ORDERING, NUM_OF_POSTS, CursorPaginator
+from posts.stats import stats_for
+from posts.timeline import follow_posts
+
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, comment_data,
+                          page_data, post_data, profile_data)
+
+MAX_LIMIT = 100
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _error(message, status):
+    return _json({'detail': message}, status)
+
+
+def api_view(methods, login_methods=()):
+    """
+    Разрешённые методы, вход для login_methods и ошибки в виде JSON
+    вместо HTML-страниц и редиректов на форму входа.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = _error('Метод не поддерживается', 405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            if (request.method in login_methods
+                    and not request.user.is_authenticated):
+                return _error('Требуется вход', 401)
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return _error('Не найдено', 404)
+            except BadRequest as error:
+                return _error(str(error), 400)
+        return wrapper
+    return decorator
+
+
+def _form_data(request):
+    """Данные формы из JSON-тела или из обычной формы с файлами."""
+    if request.content_type != 'application/json':
+        if request.method == 'POST':
+            return request.POST, request.FILES
+        # У PATCH Django тело не разбирает: request.POST и FILES пусты.
+        # Поля отдаются обычным словарём, как из JSON.
+        if request.content_type == 'multipart/form-data':
+            try:
+                data, files = request.parse_file_upload(request.META,
+                                                        request)
+            except MultiPartParserError:
+                raise BadRequest('Неверное тело multipart/form-data')
+            return data.dict(), files
+        return QueryDict(request.body, encoding=request.encoding).dict(), None
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise BadRequest('Неверный JSON')
+    if not isinstance(data, dict):
+        raise BadRequest('Ожидается JSON-объект')
+    return data, None
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', NUM_OF_POSTS))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _page(request, queryset, ordering=None):
+    kwargs = {'ordering': ordering} if ordering else {}
+    paginator = CursorPaginator(queryset, _limit(request), **kwargs)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def _posts():
+    return Post.objects.select_related('author', 'group').only(*POST_FIELDS)
+
+
+def _post_list(request, queryset):
+    page = _page(request, queryset)
+    # comments_count у каждого поста свой: ETag списка — и по версиям
+    # его постов (versioned_page(item_scopes=True)).
+    request.item_scopes = [post_scope(post.id) for post in page]
+    return _json(page_data(page, post_data))
+
+
+def _follow_feed_scopes(user):
+    # Вход api_view проверяет раньше, чем считается ETag.
+    return [follow_feed_scope(user.id)] if user.is_authenticated else []
+
+
+@api_view(('GET', 'POST'), login_methods=('POST',))
+@versioned_page(lambda: [GLOBAL_SCOPE], item_scopes=True)
+def posts(request):
+    if request.method == 'GET':
+        return _post_list(request, _posts())
+    data, files = _form_data(request)
+    form = PostForm(data, files=files)
+    if not form.is_valid():
+        return _json({'errors': form.errors.get_json_data()}, 400)
+    form.instance.author = request.user
+    post = form.save()
+    thumbnails.schedule(post.image.name)
+    return _json(post_data(post), 201)
+
+
+def _post_etag(request, post_id):
+    # Пост меняется и без нового pub_date: правка текста, комментарии.
+    row = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', 'text', 'group_id', 'image', 'comments_count').first()
+    if row is None:
+        return None
+    return hashlib.md5(repr(row).encode()).hexdigest()
+
+
+@api_view(('GET', 'PATCH'), login_methods=('PATCH',))
+@condition(etag_func=_post_etag)
+def post_detail(request, post_id):
+    post = get_object_or_404(_posts(), pk=post_id)
+    if request.method == 'GET':
+        return _json(post_data(post))
+    if post.author_id != request.user.id:
+        return _error('Изменять пост может только автор', 403)
+    data, files = _form_data(request)
+    # PATCH меняет только переданные поля.
+    form = PostForm(dict({'text': post.text, 'group': post.group_id}, **data),
+                    files=files, instance=post)
+    if not form.is_valid():
+        return _json({'errors': form.errors.get_json_data()}, 400)
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post.image.name)
+    return _json(post_data(post))
+
+
+@api_view(('GET', 'POST'), login_methods=('POST',))
+@versioned_page(lambda post_id: [post_scope(post_id)])
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    if request.method == 'GET':
+        queryset = Comment.objects.filter(post=post).select_related(
+            'author').only(*COMMENT_FIELDS)
+        return _json(page_data(
+            _page(request, queryset, COMMENT_ORDERING), comment_data))
+    data, _ = _form_data(request)
+    form = CommentForm(data)
+    if not form.is_valid():
+        return _json({'errors': form.errors.get_json_data()}, 400)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    return _json(comment_data(comment), 201)
+
+
+@api_view(('GET',))
+@versioned_page(lambda slug: [group_scope(slug)], item_scopes=True)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _post_list(request, _posts().filter(group=group))
+
+
+@api_view(('GET',))
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    following = (request.user.is_authenticated
+                 and Follow.objects.filter(user=request.user,
+                                           author=author).exists())
+    return _json(profile_data(author, stats_for(author), following))
+
+
+@api_view(('GET',))
+@versioned_page(lambda username: [author_scope(username)],
+                item_scopes=True)
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return _post_list(request, _posts().filter(author=author))
+
+
+@api_view(('GET',), login_methods=('GET',))
+@versioned_page(lambda: [], user_scopes=_follow_feed_scopes,
+                item_scopes=True)
+def follow_feed(request):
+    return _post_list(request, follow_posts(request.user).only(*POST_FIELDS))
+
+
+@api_view(('POST', 'DELETE'), login_methods=('POST', 'DELETE'))
+def follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == 'DELETE':
+        Follow.objects.filter(user=request.user, author=author).delete()
+        return HttpResponse(status=204)
+    if author == request.user:
+        return _error('Нельзя подписаться на себя', 400)
+    _, created = Follow.objects.get_or_create(user=request.user,
+                                              author=author)
+    return _json({'author': author.username, 'following': True},
+                 201 if created else 200)
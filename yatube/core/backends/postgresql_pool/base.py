@@ -0,0 +1,77 @@
+"""
+PostgreSQL с пулом соединений psycopg2 внутри процесса.
+
+Django 2.2 открывает соединение на поток и закрывает его по
+CONN_MAX_AGE; здесь «открыть» значит взять готовое соединение из
+ThreadedConnectionPool, а «закрыть» — вернуть его обратно. Размер пула
+задают ключи POOL_MIN_SIZE и POOL_MAX_SIZE в DATABASES.
+
+Пустой ThreadedConnectionPool сразу бросает PoolError, поэтому поток
+сперва ждёт свободное место на семафоре, но не дольше POOL_TIMEOUT
+секунд: всплеск запросов ставится в очередь, а не падает с 500.
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import OperationalError, pool
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class BoundedPool:
+    """ThreadedConnectionPool с ожиданием свободного соединения."""
+
+    def __init__(self, minconn, maxconn, timeout, **conn_params):
+        self.pool = pool.ThreadedConnectionPool(minconn, maxconn,
+                                                **conn_params)
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Нет свободного соединения в пуле за {self.timeout} с')
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            self.pool.putconn(connection, close=close)
+        finally:
+            self.slots.release()
+
+
+def _get_pool(alias, settings_dict, conn_params):
+    with _lock:
+        if alias not in _pools:
+            _pools[alias] = BoundedPool(
+                settings_dict.get('POOL_MIN_SIZE', 1),
+                settings_dict.get('POOL_MAX_SIZE', 10),
+                settings_dict.get('POOL_TIMEOUT', 10),
+                **conn_params)
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = _get_pool(
+            self.alias, self.settings_dict, conn_params).getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # Незавершённую транзакцию пул откатит сам; сломанное
+            # соединение закрывается, а не возвращается.
+            _pools[self.alias].putconn(
+                self.connection, close=bool(self.connection.closed))
@@ -0,0 +1,8 @@
+from django.utils.module_loading import import_string
+
+
+def create_cache(config):
+    """Бэкенд кеша по словарю в формате одного элемента CACHES."""
+    params = dict(config)
+    backend = import_string(params.pop('BACKEND'))
+    return backend(params.pop('LOCATION', ''), params)
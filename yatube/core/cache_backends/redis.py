@@ -0,0 +1,114 @@
+"""
+Кеш в Redis для нескольких серверов.
+
+Нужен пакет redis (pip install redis); модуль импортируется только
+тогда, когда бэкенд выбран в CACHES. Целые числа хранятся как есть,
+чтобы incr выполнялся в самом Redis, остальное — через pickle.
+"""
+import pickle
+
+import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class RedisCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.client = redis.Redis.from_url(
+            location or 'redis://localhost:6379/0', **options)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        """Срок в секундах от текущего момента: его ждёт Redis."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(0, int(timeout))
+
+    @staticmethod
+    def _dumps(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        value = self.client.get(self._key(key, version))
+        return default if value is None else self._loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        values = self.client.mget(list(keys))
+        return {original: self._loads(value)
+                for original, value in zip(keys.values(), values)
+                if value is not None}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        key = self._key(key, version)
+        if timeout == 0:
+            self.client.delete(key)
+        else:
+            self.client.set(key, self._dumps(value), ex=timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        with self.client.pipeline() as pipe:
+            for key, value in data.items():
+                key = self._key(key, version)
+                if timeout == 0:
+                    pipe.delete(key)
+                else:
+                    pipe.set(key, self._dumps(value), ex=timeout)
+            pipe.execute()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout == 0:
+            return False
+        return bool(self.client.set(self._key(key, version),
+                                    self._dumps(value), ex=timeout, nx=True))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        key = self._key(key, version)
+        if timeout is None:
+            return bool(self.client.persist(key))
+        return bool(self.client.expire(key, timeout))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self.client.exists(key):
+            raise ValueError(f"Key '{key}' not found")
+        return self.client.incrby(key, delta)
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def delete(self, key, version=None):
+        self.client.delete(self._key(key, version))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.client.flushdb()
+
+    def close(self, **kwargs):
+        # Соединения остаются в пуле клиента redis.
+        pass
@@ -0,0 +1,170 @@
+"""
+Двухуровневый кеш: LRU в памяти процесса перед общим кешем.
+
+Попадание в локальный уровень не ходит ни в файл, ни в сеть. Ключи с
+префиксами SHARED_ONLY — версии областей (posts.cache) и значения,
+которые перезаписываются при их смене (posts.recompute), — всегда
+читаются из общего уровня, и сдвиг версии в одном воркере сразу виден
+остальным. Прочие ключи, которые могут перезаписываться другими
+процессами, живут локально не дольше LOCAL_TIMEOUT секунд.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import create_cache
+
+_MISS = object()
+# Django создаёт бэкенд кеша на каждый поток; локальный уровень, как и
+# у LocMemCache, один на процесс для каждого LOCATION.
+_locals = {}
+_locals_lock = threading.Lock()
+
+
+class LocalLRU:
+    """Ограниченный по числу записей словарь со сроками жизни."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return _MISS
+            value, expires = item
+            if expires <= time.monotonic():
+                del self.items[key]
+                return _MISS
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value, seconds):
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + seconds)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_entries:
+                self.items.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared = create_cache(options['SHARED'])
+        with _locals_lock:
+            self.local = _locals.setdefault(location, LocalLRU(
+                options.get('LOCAL_MAX_ENTRIES', 1000)))
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 300)
+        self.shared_only = tuple(options.get('SHARED_ONLY', ('version:',)))
+
+    def _local_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _remember(self, key, value, timeout, version):
+        if key.startswith(self.shared_only):
+            return
+        local_key = self._local_key(key, version)
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        seconds = self.local_timeout
+        if timeout is not None:
+            seconds = min(seconds, timeout)
+        if seconds > 0:
+            self.local.set(local_key, value, seconds)
+        else:
+            self.local.discard(local_key)
+
+    def _forget(self, key, version):
+        self.local.discard(self._local_key(key, version))
+
+    def get(self, key, default=None, version=None):
+        if not key.startswith(self.shared_only):
+            value = self.local.get(self._local_key(key, version))
+            if value is not _MISS:
+                return value
+        value = self.shared.get(key, _MISS, version)
+        if value is _MISS:
+            return default
+        self._remember(key, value, DEFAULT_TIMEOUT, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = _MISS
+            if not key.startswith(self.shared_only):
+                value = self.local.get(self._local_key(key, version))
+            if value is _MISS:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            for key, value in shared.items():
+                self._remember(key, value, DEFAULT_TIMEOUT, version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._remember(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if key in failed:
+                self._forget(key, version)
+            else:
+                self._remember(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._remember(key, value, timeout, version)
+        else:
+            # Значение уже записал другой процесс: локальное может быть чужим.
+            self._forget(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._forget(key, version)
+        return self.shared.incr(key, delta, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISS, version) is not _MISS
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(key, version)
+        self.shared.delete_many(keys, version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
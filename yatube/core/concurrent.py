@@ -0,0 +1,58 @@
+"""
+Независимые запросы одного представления — одновременно.
+
+Каждая функция выполняется в своём потоке со своим соединением с базой,
+поэтому время ответа — самый долгий запрос, а не их сумма. Включается
+VIEW_CONCURRENT_LOOKUPS: выигрыш есть на сетевой базе (PostgreSQL,
+реплики), а на локальном SQLite поток дороже самого запроса. Внутри
+транзакции (ATOMIC_REQUESTS, тесты) функции идут по очереди: другие
+соединения не видят её незакоммиченных данных.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from . import metrics, routers
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.VIEW_LOOKUP_THREADS,
+                thread_name_prefix='lookups')
+        return _executor
+
+
+def _call(func, pinned, stats):
+    # Привязка к основной базе и замеры метрик живут в потоке запроса:
+    # переносим их.
+    if pinned:
+        routers.pin_to_primary()
+    try:
+        with metrics.measuring(*stats):
+            return func()
+    finally:
+        routers.reset()
+        close_old_connections()
+
+
+def gather(*funcs):
+    """Результаты funcs() в том же порядке; ошибка первой из них — наружу."""
+    if (not settings.VIEW_CONCURRENT_LOOKUPS or len(funcs) < 2
+            or connection.in_atomic_block):
+        return [func() for func in funcs]
+    pinned = routers.is_pinned()
+    stats = metrics.active_stats()
+    futures = [_get_executor().submit(_call, func, pinned, stats)
+               for func in funcs[1:]]
+    # Первая функция — в потоке запроса, пока остальные ждут в пуле.
+    results = [funcs[0]()]
+    results.extend(future.result() for future in futures)
+    return results
@@ -0,0 +1,239 @@
+"""
+Лёгкие метрики запросов: гистограммы в памяти процесса и их вывод в
+текстовом формате Prometheus.
+
+Шаблоны и кеш инструментируются один раз при старте (install_hooks):
+обёртки проверяют поле потока и ничего не делают, если текущий запрос
+не попал в выборку METRICS_SAMPLE_RATE.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_local = threading.local()
+_MISS = object()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestStats:
+    """
+    Счётчики одного запроса; живут в поле потока, пока он выполняется, и
+    в потоках core.concurrent.gather, поэтому SQL и кеш считаются под
+    блокировкой.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.queries += 1
+                self.db_time += elapsed
+
+
+HISTOGRAMS = {
+    'yatube_request_duration_seconds': (
+        'Время обработки запроса', TIME_BUCKETS),
+    'yatube_db_queries': ('Число SQL-запросов на запрос', QUERY_BUCKETS),
+    'yatube_db_duration_seconds': ('Время в базе данных', TIME_BUCKETS),
+    'yatube_template_duration_seconds': (
+        'Время рендеринга шаблонов', TIME_BUCKETS),
+}
+COUNTERS = {
+    'yatube_cache_hits_total': 'Попадания в кеш',
+    'yatube_cache_misses_total': 'Промахи кеша',
+}
+# События пересчёта значений в кеше (posts.recompute); считаются во всех
+# запросах, не только в выборке, с меткой key — именем значения.
+EVENTS = {
+    'yatube_recompute_total': 'Пересчёты значений в кеше',
+    'yatube_recompute_early_total': 'Досрочные пересчёты до истечения срока',
+    'yatube_recompute_coalesced_total':
+        'Запросы, не пересчитавшие значение, пока его пересчитывал другой',
+    'yatube_recompute_stale_total':
+        'Запросы, получившие прежнее значение на время пересчёта',
+}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for name, (_, buckets) in HISTOGRAMS.items()
+        }
+        self.counters = {name: defaultdict(int) for name in COUNTERS}
+        self.events = {name: defaultdict(int) for name in EVENTS}
+        self.requests = defaultdict(int)
+
+    def count(self, name, key):
+        with self.lock:
+            self.events[name][key] += 1
+
+    def record(self, view, status, duration, stats):
+        with self.lock:
+            self.requests[view, status] += 1
+            values = {
+                'yatube_request_duration_seconds': duration,
+                'yatube_db_queries': stats.queries,
+                'yatube_db_duration_seconds': stats.db_time,
+                'yatube_template_duration_seconds': stats.template_time,
+            }
+            for name, value in values.items():
+                self.histograms[name][view].observe(value)
+            self.counters['yatube_cache_hits_total'][view] += stats.cache_hits
+            self.counters['yatube_cache_misses_total'][view] += (
+                stats.cache_misses)
+
+    def render(self):
+        lines = [
+            '# HELP yatube_requests_sampled_total Запросы в выборке',
+            '# TYPE yatube_requests_sampled_total counter',
+        ]
+        with self.lock:
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'yatube_requests_sampled_total{{view="{view}",'
+                    f'status="{status}"}} {count}')
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(self.histograms[name].items()):
+                    lines.extend(histogram.lines(name, f'view="{view}"'))
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, value in sorted(self.counters[name].items()):
+                    lines.append(f'{name}{{view="{view}"}} {value}')
+            for name, help_text in EVENTS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(self.events[name].items()):
+                    lines.append(f'{name}{{key="{key}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def active_stats():
+    """Все замеры потока, от внешнего к текущему."""
+    return tuple(getattr(_local, 'stack', ()))
+
+
+def current_stats():
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def measuring(*stats):
+    """
+    Считает в stats SQL-запросы этого потока ко всем базам (и репликам),
+    а в последнем из них — ещё шаблоны и кеш. Соединения у каждого
+    потока свои: пул gather входит в measuring заново.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.extend(stats)
+    try:
+        with ExitStack() as wrappers:
+            for alias in connections:
+                for item in stats:
+                    wrappers.enter_context(connections[alias].execute_wrapper(
+                        item.execute_wrapper))
+            yield
+    finally:
+        del stack[len(stack) - len(stats):]
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        stats = current_stats()
+        if stats is None:
+            return render(self, context)
+        # Вложенные шаблоны (include, extends) не считаем повторно.
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISS, version)
+        with stats.lock:
+            if value is _MISS:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISS else value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def install_hooks(cache_aliases):
+    """Инструментирует рендеринг шаблонов и чтение из кешей."""
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed_render(Template.render)
+    for alias in cache_aliases:
+        backend_class = type(caches[alias])
+        if not getattr(backend_class.get, 'instrumented', False):
+            backend_class.get = _counted_get(backend_class.get)
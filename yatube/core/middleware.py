@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.conf import settings
+
+from . import metrics, routers
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class MetricsMiddleware:
+    """
+    Снимает метрики с доли запросов METRICS_SAMPLE_RATE: время ответа,
+    число и время SQL-запросов, время шаблонов, попадания в кеш.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install_hooks(settings.CACHES)
+
+    def __call__(self, request):
+        if (not settings.METRICS_ENABLED
+                or random.random() >= settings.METRICS_SAMPLE_RATE):
+            return self.get_response(request)
+        stats = metrics.RequestStats()
+        start = time.perf_counter()
+        with metrics.measuring(stats):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.record(view, response.status_code, duration, stats)
+        return response
+
+
+class PrimaryPinMiddleware:
+    """
+    Читать из основной базы, если пользователь недавно писал: после
+    записи ставится подписанная кука на PRIMARY_PIN_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        if request.method not in SAFE_METHODS or request.get_signed_cookie(
+                PIN_COOKIE, default=None,
+                max_age=settings.PRIMARY_PIN_SECONDS):
+            routers.pin_to_primary()
+        try:
+            response = self.get_response(request)
+            if routers.has_written():
+                response.set_signed_cookie(
+                    PIN_COOKIE, '1', max_age=settings.PRIMARY_PIN_SECONDS,
+                    httponly=True, samesite='Lax')
+        finally:
+            routers.reset()
+        return response
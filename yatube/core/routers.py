@@ -0,0 +1,65 @@
+"""
+Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. Поток, который хоть
+раз писал (router.db_for_write), дальше читает только из основной
+базы; middleware PrimaryPinMiddleware переносит эту привязку на
+следующие запросы пользователя на PRIMARY_PIN_SECONDS, чтобы он сразу
+видел свои посты, комментарии и подписки несмотря на отставание реплик.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Сессию, записанную при входе, нужно читать сразу и без отставания.
+# Очередь задач читают воркеры, им тоже нужна свежая картина.
+PRIMARY_ONLY_APPS = {'sessions', 'jobs'}
+# Постановка задачи не меняет того, что видит пользователь, и не
+# привязывает его к основной базе.
+BACKGROUND_APPS = {'jobs'}
+
+_state = threading.local()
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'written', False)
+
+
+def reset():
+    _state.pinned = False
+    _state.written = False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = [alias for alias in settings.DATABASE_REPLICAS
+                    if alias in connections]
+        if (not replicas or is_pinned()
+                or model._meta.app_label in PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in BACKGROUND_APPS:
+            return DEFAULT_DB_ALIAS
+        _state.written = True
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
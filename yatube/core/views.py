@@ -1,7 +1,20 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
 
 
 def csrf_failure(request, reason=''):
+    match = request.resolver_match
+    if match and match.namespace == 'api':
+        # Клиенту API нужна причина в JSON, а не HTML-страница.
+        return JsonResponse({'detail': f'Ошибка CSRF: {reason}'}, status=403,
+                            json_dumps_params={'ensure_ascii': False})
     return render(request, 'core/403csrf.html')
 
 
@@ -11,3 +24,20 @@ def page_not_found(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html')
+
+
+def _metrics_response(request):
+    return HttpResponse(registry.render(),
+                        content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+_staff_metrics = staff_member_required(_metrics_response)
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus: по токену или для персонала."""
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and constant_time_compare(header, f'Bearer {token}'):
+        return _metrics_response(request)
+    return _staff_metrics(request)
@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import schedule_periodic
+from jobs.worker import serve, work
+
+
+def _serve_process(threads, batch_size, poll):
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    serve(threads, stop, batch_size, poll)
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди: --processes процессов '
+            'по --threads потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            default=settings.TASK_WORKER_THREADS)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.TASK_BATCH_SIZE)
+        parser.add_argument('--poll', type=float,
+                            default=settings.TASK_POLL_SECONDS,
+                            help='Пауза в секундах, когда задач нет.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            schedule_periodic()
+            total = 0
+            while True:
+                done = work(options['batch_size'])
+                if not done:
+                    break
+                total += done
+            self.stdout.write(f'Выполнено задач: {total}')
+            return
+        worker_args = (options['threads'], options['batch_size'],
+                       options['poll'])
+        if options['processes'] == 1:
+            _serve_process(*worker_args)
+            return
+        # Дочерние процессы не должны делить соединения родителя.
+        connections.close_all()
+        processes = [multiprocessing.Process(target=_serve_process,
+                                             args=worker_args)
+                     for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, stop)
+        for process in processes:
+            process.join()
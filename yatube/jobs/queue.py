@@ -0,0 +1,97 @@
+"""
+Очередь фоновых задач в таблице Job.
+
+Задача объявляется декоратором @task в модуле tasks.py приложения и
+ставится вызовом .delay(*args, key=..., **kwargs). Строка Job пишется
+в текущей транзакции, если она открыта (админка, пачки импорта), и
+тогда не переживёт отката. ATOMIC_REQUESTS выключен, поэтому в
+обычном запросе данные и Job — две отдельные записи: если процесс
+упадёт между ними, задача потеряется. Задачу, которой нужны уже
+зафиксированные данные, ставят из transaction.on_commit (так делает
+posts.signals). Выполняют задачи воркеры (manage.py run_workers), а при
+TASKS_SYNC — вызывающий поток после фиксации транзакции, как увидел
+бы их и воркер: так по умолчанию при DEBUG и в тестах. Задачу
+@task(every=секунды) воркеры ставят сами раз в every секунд.
+"""
+import functools
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Job
+
+registry = {}
+# Периодические задачи: имя -> период в секундах.
+periodic = {}
+# Последний период, за который задача уже поставлена этим процессом.
+_scheduled = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, key=None, countdown=0, **kwargs):
+        """Ставит задачу в очередь; аргументы должны сериализоваться в JSON."""
+        return enqueue(self.name, args, kwargs, key=key, countdown=countdown,
+                       max_attempts=self.max_attempts)
+
+
+def task(func=None, *, name=None, max_attempts=None, every=None):
+    """Регистрирует функцию как фоновую задачу: @task или @task(...)."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        registry[task_name] = Task(func, task_name, max_attempts)
+        if every:
+            periodic[task_name] = every
+        return registry[task_name]
+    return decorator(func) if func is not None else decorator
+
+
+def schedule_periodic(now=None):
+    """
+    Ставит периодические задачи, чей период начался. Ключ — имя и номер
+    периода, поэтому из нескольких воркеров задачу поставит один.
+    """
+    now = now or timezone.now()
+    for name, every in periodic.items():
+        slot = int(now.timestamp() // every)
+        if _scheduled.get(name) != slot:
+            registry[name].delay(key=f'{name}@{slot}')
+            _scheduled[name] = slot
+
+
+def enqueue(name, args=(), kwargs=None, key=None, countdown=0,
+            max_attempts=None):
+    """
+    Ставит задачу name. Задача с уже известным ключом key повторно не
+    ставится: возвращается None, иначе — новая строка Job.
+    """
+    if name not in registry:
+        raise LookupError(f'Неизвестная задача {name}')
+    kwargs = kwargs or {}
+    payload = json.dumps({'args': list(args), 'kwargs': kwargs})
+    if settings.TASKS_SYNC:
+        transaction.on_commit(lambda: registry[name](*args, **kwargs))
+        return None
+    job = Job(name=name, payload=payload, key=key,
+              max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+              run_at=timezone.now() + timedelta(seconds=countdown))
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
@@ -0,0 +1,132 @@
+"""
+Выполнение задач из таблицы Job.
+
+Воркер забирает задачу условным UPDATE (queued -> running): строку
+получает только один из конкурирующих воркеров, и это работает и в
+SQLite, где нет SELECT ... FOR UPDATE SKIP LOCKED. Сама задача идёт вне
+транзакции очереди и не держит блокировку записи SQLite всё время
+работы, а итог пишется вторым условным UPDATE по номеру попытки. Задача
+упавшего воркера возвращается в работу, когда истечёт
+TASK_LEASE_SECONDS, — выполнение «хотя бы один раз».
+Ошибка ведёт к повтору через TASK_BACKOFF_SECONDS * 2 ** (попытка - 1)
+с разбросом; после max_attempts попыток задача помечается failed.
+"""
+import json
+import logging
+import random
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .queue import registry, schedule_periodic
+
+logger = logging.getLogger(__name__)
+
+MAX_ERROR_LENGTH = 4000
+
+
+def _ready(now):
+    return (Q(status=Job.QUEUED, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now))
+
+
+def claim(limit):
+    """Забирает до limit готовых задач, которые не взял другой воркер."""
+    now = timezone.now()
+    candidates = Job.objects.filter(_ready(now)).order_by(
+        'run_at').values_list('pk', flat=True)[:limit]
+    claimed = [
+        pk for pk in candidates
+        if Job.objects.filter(_ready(now), pk=pk).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.TASK_LEASE_SECONDS))
+    ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def backoff(attempt):
+    """Пауза перед повтором: растёт вдвое, со случайным разбросом."""
+    delay = settings.TASK_BACKOFF_SECONDS * 2 ** (attempt - 1)
+    return min(delay, settings.TASK_BACKOFF_MAX) * (0.5 + random.random())
+
+
+def _finish(job, **changes):
+    """
+    Итог попытки. Если аренда истекла и задачу уже забрал другой
+    воркер, строка не меняется: итог теперь за ним.
+    """
+    updated = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts,
+    ).update(locked_until=None, **changes)
+    if not updated:
+        logger.warning('Задача %s: аренда потеряна, итог не записан', job)
+    return bool(updated)
+
+
+def run(job):
+    """Выполняет задачу вне транзакции и отмечает её итог."""
+    try:
+        data = json.loads(job.payload)
+        registry[job.name](*data['args'], **data['kwargs'])
+    except Exception:
+        _fail(job, traceback.format_exc())
+        return False
+    _finish(job, status=Job.DONE, finished=timezone.now())
+    return True
+
+
+def _fail(job, error):
+    now = timezone.now()
+    changes = {'last_error': error[-MAX_ERROR_LENGTH:]}
+    if job.attempts >= job.max_attempts:
+        changes.update(status=Job.FAILED, finished=now)
+        logger.error('Задача %s не выполнена:\n%s', job, error)
+    else:
+        changes.update(status=Job.QUEUED, run_at=now + timedelta(
+            seconds=backoff(job.attempts)))
+        logger.warning('Задача %s упала, повтор позже:\n%s', job, error)
+    _finish(job, **changes)
+
+
+def work(limit=None):
+    """Выполняет одну порцию задач; возвращает её размер."""
+    jobs = claim(limit or settings.TASK_BATCH_SIZE)
+    for job in jobs:
+        run(job)
+    return len(jobs)
+
+
+def prune():
+    """Удаляет выполненные задачи старше TASK_RETENTION_DAYS."""
+    border = timezone.now() - timedelta(days=settings.TASK_RETENTION_DAYS)
+    Job.objects.filter(status=Job.DONE, finished__lt=border).delete()
+
+
+def _run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        close_old_connections()
+
+
+def serve(threads, stop, batch_size=None, poll=None):
+    """Цикл воркера: задачи выполняет пул из threads потоков до stop."""
+    batch_size = batch_size or settings.TASK_BATCH_SIZE
+    poll = settings.TASK_POLL_SECONDS if poll is None else poll
+    with ThreadPoolExecutor(max_workers=threads,
+                            thread_name_prefix='jobs') as pool:
+        while not stop.is_set():
+            schedule_periodic()
+            jobs = claim(batch_size)
+            if jobs:
+                list(pool.map(_run_in_thread, jobs))
+            else:
+                prune()
+                close_old_connections()
+                stop.wait(poll)
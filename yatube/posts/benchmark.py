@@ -0,0 +1,490 @@
+"""
+Нагрузочный бенчмарк лент: генерация большого набора данных и прогон
+страниц posts через тестовый клиент с замером латентности и числа
+SQL-запросов. Результат — JSON, который сравнивается с сохранённым
+эталоном (baseline). Отдельно сравнивается латентность попаданий в
+разные уровни кеша (run_cache) и пропускная способность WSGI и ASGI
+под одновременной нагрузкой (run_serving).
+"""
+import asyncio
+import io
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+from core import metrics
+from core.asgi import WsgiToAsgi, build_environ
+from core.cache_backends import create_cache
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .paginator import DEFAULT_ORDERING, NUM_OF_POSTS, CursorPaginator
+from .stats import recount_all
+
+BENCH_ADDR = '192.0.2.1'
+# Страницы для сравнения WSGI и ASGI: ленты, которые читают чаще всего.
+SERVING_PAGES = ('index', 'group_posts', 'profile', 'post_detail',
+                 'follow_index')
+WORDS = (
+    'утро вечер город река лес поле дорога дом окно книга письмо '
+    'песня море ветер снег дождь солнце луна звезда кофе чай поезд '
+    'станция мост улица парк сад рыбалка щука спиннинг охота поход '
+    'горы озеро небо облако фото кино театр музей школа работа отпуск'
+).split()
+
+
+def _text(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(5, 40))).capitalize()
+
+
+def _skewed(rng, items, power):
+    """Элемент списка с перекосом к началу: немногие авторы популярны."""
+    return items[int(len(items) * rng.random() ** power)]
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk(model, rows, batch_size, log, **kwargs):
+    total = 0
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, **kwargs)
+        total += len(batch)
+        log(f'{model._meta.verbose_name_plural}: {total}')
+    return total
+
+
+def seed(users=1000, groups=50, posts=100000, follows=10000, comments=0,
+         batch_size=5000, prefix='bench', random_seed=0, log=print,
+         stdout=None):
+    """
+    Быстро создаёт набор данных через bulk_create. Сигналы при этом не
+    срабатывают, поэтому счётчики, поисковый индекс и ленты подписок
+    пересчитываются в конце.
+    """
+    rng = random.Random(random_seed)
+    password = make_password(None)
+    _bulk(User, (
+        User(username=f'{prefix}_{number}', password=password)
+        for number in range(users)
+    ), batch_size, log)
+    user_ids = list(User.objects.filter(
+        username__startswith=f'{prefix}_').order_by('id').values_list(
+        'id', flat=True))
+    _bulk(Group, (
+        Group(title=f'Группа {number}', slug=f'{prefix}-{number}',
+              description=_text(rng))
+        for number in range(groups)
+    ), batch_size, log)
+    group_ids = list(Group.objects.filter(
+        slug__startswith=f'{prefix}-').values_list('id', flat=True))
+    _bulk(Post, (
+        Post(author_id=_skewed(rng, user_ids, 2), text=_text(rng),
+             group_id=(rng.choice(group_ids)
+                       if group_ids and rng.random() < 0.7 else None))
+        for _ in range(posts)
+    ), batch_size, log)
+    pairs = set()
+    for _ in range(follows):
+        user_id = rng.choice(user_ids)
+        author_id = _skewed(rng, user_ids, 3)
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    _bulk(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in sorted(pairs)
+    ), batch_size, log, ignore_conflicts=True)
+    if comments:
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids).order_by('-id').values_list(
+            'id', flat=True))
+        _bulk(Comment, (
+            Comment(post_id=_skewed(rng, post_ids, 3),
+                    author_id=rng.choice(user_ids), text=_text(rng))
+            for _ in range(comments)
+        ), batch_size, log)
+    recount_all(batch_size=batch_size)
+    call_command('rebuild_search_index', batch_size=batch_size,
+                 stdout=stdout)
+    call_command('rebuild_timelines', stdout=stdout)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def targets():
+    """Страницы для замера: самые тяжёлые автор, группа и читатель."""
+    feed = Post.objects.order_by(*DEFAULT_ORDERING)
+    latest = feed.first()
+    if latest is None:
+        raise ValueError('Нет постов: сначала запустите seed_benchmark.')
+    author = AuthorStats.objects.order_by('-posts_count').first().user
+    reader = AuthorStats.objects.order_by('-following_count').first().user
+    group = Group.objects.filter(posts__isnull=False).first()
+    deep = feed[min(feed.count(), NUM_OF_POSTS * 5) - 1]
+    cursor = CursorPaginator(feed, NUM_OF_POSTS).encode_cursor(
+        deep, 'next', 5)
+    index = reverse('posts:index')
+    pages = [
+        ('index', index, None),
+        ('index_page_5', f'{index}?page=5', None),
+        ('index_cursor_6', f'{index}?cursor={cursor}', None),
+        ('profile', reverse('posts:profile', args=[author.username]), None),
+        ('post_detail', reverse('posts:post_detail', args=[latest.id]),
+         None),
+        ('follow_index', reverse('posts:follow_index'), reader),
+        ('search', f"{reverse('posts:search')}?q={WORDS[0]}", None),
+    ]
+    if group is not None:
+        pages.insert(3, ('group_posts', reverse(
+            'posts:group_posts', args=[group.slug]), None))
+    return pages
+
+
+def measure(client, url, iterations, warmup=2, cold=False):
+    for _ in range(warmup):
+        client.get(url)
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        # Запросы ко всем базам, включая реплики и потоки gather.
+        stats = metrics.RequestStats()
+        with metrics.measuring(stats):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise ValueError(f'{url}: ответ {response.status_code}')
+        queries.append(stats.queries)
+    return {
+        'url': url,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': max(queries),
+    }
+
+
+def run(iterations=50, warmup=2, cold=False, only=None):
+    results = {}
+    for name, url, user in targets():
+        if only and name not in only:
+            continue
+        # Адрес не из INTERNAL_IPS: debug_toolbar не должен попадать в замер.
+        client = Client(REMOTE_ADDR=BENCH_ADDR)
+        if user is not None:
+            client.force_login(user)
+        results[name] = measure(client, url, iterations, warmup, cold)
+    return {
+        'dataset': {
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'follows': Follow.objects.count(),
+            'comments': Comment.objects.count(),
+        },
+        'iterations': iterations,
+        'cold_cache': cold,
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=0.25, min_delta_ms=1.0):
+    """
+    Регрессии относительно эталона: рост числа запросов — всегда,
+    p95 — если он больше эталона на долю tolerance и на min_delta_ms.
+    """
+    regressions = []
+    for name, old in baseline.get('results', {}).items():
+        new = report['results'].get(name)
+        if new is None:
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append(
+                f"{name}: запросов {old['queries']} -> {new['queries']}")
+        limit = max(old['p95_ms'] * (1 + tolerance),
+                    old['p95_ms'] + min_delta_ms)
+        if new['p95_ms'] > limit:
+            regressions.append(
+                f"{name}: p95 {old['p95_ms']} -> {new['p95_ms']} мс")
+    return regressions
+
+
+def cache_tiers(directory, redis_url=None):
+    """Конфигурации кешей для сравнения; файлы создаются в directory."""
+    sqlite = {'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+              'LOCATION': os.path.join(directory, 'cache.sqlite3')}
+    tiers = {
+        'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                   'LOCATION': 'benchmark'},
+        'file': {'BACKEND': 'django.core.cache.backends.filebased.'
+                            'FileBasedCache',
+                 'LOCATION': os.path.join(directory, 'file')},
+        'sqlite': sqlite,
+        'tiered+sqlite': {'BACKEND': 'core.cache_backends.tiered.TieredCache',
+                          'LOCATION': 'benchmark-sqlite',
+                          'OPTIONS': {'SHARED': sqlite}},
+    }
+    if redis_url:
+        redis = {'BACKEND': 'core.cache_backends.redis.RedisCache',
+                 'LOCATION': redis_url}
+        tiers['redis'] = redis
+        tiers['tiered+redis'] = {
+            'BACKEND': 'core.cache_backends.tiered.TieredCache',
+            'LOCATION': 'benchmark-redis', 'OPTIONS': {'SHARED': redis}}
+    return tiers
+
+
+def _timed_gets(backend, names, rounds):
+    timings = []
+    for _ in range(rounds):
+        for name in names:
+            start = time.perf_counter()
+            backend.get(name)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_cache(backend, keys=200, size=4096, rounds=5):
+    """Латентность попаданий и промахов; значение — фрагмент size байт."""
+    names = [f'benchmark:{number}' for number in range(keys)]
+    backend.set_many({name: 'x' * size for name in names}, None)
+    try:
+        # Прогрев: двухуровневый кеш переносит значения в память.
+        for name in names:
+            backend.get(name)
+        hits = _timed_gets(backend, names, rounds)
+        misses = _timed_gets(
+            backend, [f'{name}:missing' for name in names], 1)
+    finally:
+        backend.delete_many(names)
+    return {
+        'hit_p50_us': round(percentile(hits, 50) * 1e6, 1),
+        'hit_p95_us': round(percentile(hits, 95) * 1e6, 1),
+        'miss_p50_us': round(percentile(misses, 50) * 1e6, 1),
+        'hits_per_second': round(len(hits) / sum(hits)),
+    }
+
+
+def run_cache(tiers, keys=200, size=4096, rounds=5):
+    results = {}
+    for name, config in tiers.items():
+        backend = create_cache(config)
+        try:
+            results[name] = measure_cache(backend, keys, size, rounds)
+        finally:
+            backend.close()
+    return {'keys': keys, 'value_bytes': size, 'rounds': rounds,
+            'results': results}
+
+
+def _scope(url, host, cookie=''):
+    path, _, query = url.partition('?')
+    headers = [(b'host', host.encode())]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    return {'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': query.encode(), 'headers': headers,
+            'client': (BENCH_ADDR, 0), 'server': (host, 80)}
+
+
+def serving_scopes(only=SERVING_PAGES):
+    """ASGI scope страниц targets(); читателю — кука его сессии."""
+    host = next((name for name in settings.ALLOWED_HOSTS
+                 if not name.startswith('.') and name != '*'), 'localhost')
+    scopes = []
+    for name, url, user in targets():
+        if only and name not in only:
+            continue
+        cookie = ''
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            cookie = f'{settings.SESSION_COOKIE_NAME}={session}'
+        scopes.append((name, _scope(url, host, cookie)))
+    return scopes
+
+
+def _check(name, status):
+    if status != 200:
+        raise ValueError(f'{name}: ответ {status}')
+
+
+def _call_wsgi(handler, environ):
+    statuses = []
+    chunks = handler(environ, lambda status, headers, exc_info=None:
+                     statuses.append(int(status.split(' ', 1)[0])))
+    try:
+        for _ in chunks:
+            pass
+    finally:
+        chunks.close()
+    return statuses[0]
+
+
+def _summary(timings, elapsed):
+    return {
+        'requests': len(timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def measure_wsgi(handler, scopes, requests, concurrency, workers):
+    """
+    concurrency клиентов против workers синхронных воркеров: запрос ждёт
+    свободного воркера, как в очереди gunicorn, и это время входит в
+    латентность.
+    """
+    slots = threading.Semaphore(workers)
+
+    def client(number):
+        timings = []
+        for index in range(number, requests, concurrency):
+            name, scope = scopes[index % len(scopes)]
+            start = time.perf_counter()
+            with slots:
+                status = _call_wsgi(handler,
+                                    build_environ(scope, io.BytesIO()))
+            timings.append(time.perf_counter() - start)
+            _check(name, status)
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = [value for values in pool.map(client, range(concurrency))
+                   for value in values]
+    return _summary(timings, time.perf_counter() - start)
+
+
+async def _call_asgi(app, scope):
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await app(scope, receive, send)
+    return statuses[0]
+
+
+def measure_asgi(app, scopes, requests, concurrency):
+    """Те же запросы через ASGI: concurrency клиентов в одном цикле."""
+    timings = []
+
+    async def client(number):
+        for index in range(number, requests, concurrency):
+            name, scope = scopes[index % len(scopes)]
+            start = time.perf_counter()
+            status = await _call_asgi(app, scope)
+            timings.append(time.perf_counter() - start)
+            _check(name, status)
+
+    async def clients():
+        await asyncio.gather(*(client(number)
+                               for number in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(clients())
+    return _summary(timings, time.perf_counter() - start)
+
+
+class _Latency:
+    """Пауза перед каждым SQL-запросом: так ведёт себя база по сети."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        if self.seconds:
+            connection_created.connect(self.install)
+            # Соединение этого потока уже открыто.
+            self.install(None, connections['default'])
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        if self in connections['default'].execute_wrappers:
+            connections['default'].execute_wrappers.remove(self)
+
+
+def run_serving(requests=500, concurrency=20, workers=None, only=None,
+                latency_ms=0):
+    """
+    Пропускная способность одного процесса: WSGI и ASGI при одном и том
+    же числе исполнителей — workers синхронных воркеров WSGI и пул из
+    workers потоков ASGI (по умолчанию ASGI_THREADS), иначе сравнивается
+    число исполнителей, а не серверы. latency_ms добавляет задержку к
+    каждому SQL-запросу, как у сетевой базы.
+    """
+    with _Latency(latency_ms / 1000):
+        report = _run_serving(requests, concurrency,
+                              workers or settings.ASGI_THREADS,
+                              only or SERVING_PAGES)
+    report['db_latency_ms'] = latency_ms
+    return report
+
+
+def _run_serving(requests, concurrency, workers, only):
+    scopes = serving_scopes(only)
+    handler = get_wsgi_application()
+    # Прогрев: кеш страниц и фрагментов общий для обоих замеров.
+    for name, scope in scopes:
+        _check(name, _call_wsgi(handler, build_environ(scope, io.BytesIO())))
+    app = WsgiToAsgi(handler, workers)
+    try:
+        results = {
+            'wsgi': measure_wsgi(handler, scopes, requests, concurrency,
+                                 workers),
+            'asgi': measure_asgi(app, scopes, requests, concurrency),
+        }
+    finally:
+        app.executor.shutdown()
+    return {
+        'database': connection.vendor,
+        'pages': [name for name, _ in scopes],
+        'concurrency': concurrency,
+        'workers': workers,
+        'concurrent_lookups': settings.VIEW_CONCURRENT_LOOKUPS,
+        'results': results,
+    }
@@ -0,0 +1,98 @@
+"""
+Версии (поколения) областей кеша.
+
+Версия — счётчик, начатый со времени в миллисекундах: по ней строятся
+ключи фрагментов кеша и ETag страниц. Сигналы сдвигают версии при
+изменении постов, комментариев, групп и подписок.
+"""
+import time
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+GLOBAL_SCOPE = 'posts'
+# Каталог групп: счётчики, последние записи и рейтинг.
+GROUPS_SCOPE = 'groups'
+
+
+def _now():
+    # Начало счётчика от времени: если ключ вытеснили из кеша, новая
+    # версия всё равно больше старой (сдвигов реже, чем раз в мс) и не
+    # совпадёт с устаревшими фрагментами.
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    """Текущее поколение области кеша scope."""
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _now(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*scopes):
+    """Версии нескольких областей одним обращением к кешу."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else get_version(scope)
+            for key, scope in zip(keys, scopes)]
+
+
+def bump_version(*scopes):
+    """Сдвигает поколение: все фрагменты со старой версией устаревают."""
+    for scope in set(scopes):
+        key = VERSION_KEY.format(scope)
+        # incr и add атомарны в каждом бэкенде: параллельные сдвиги не
+        # сливаются в одну версию, как при чтении и записи по отдельности.
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, _now(), None):
+                cache.incr(key)
+
+
+def bump_on_commit(*scopes):
+    """
+    bump_version после фиксации текущей транзакции. Раньше нельзя:
+    читатель успел бы закешировать старые данные под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(*scopes))
+
+
+def version_key(versions):
+    """Версии одной строкой: часть ключа фрагмента кеша."""
+    return '.'.join(map(str, versions))
+
+
+def follow_feed_scope(user_id):
+    return f'follow_feed:{user_id}'
+
+
+def group_scope(slug):
+    # quote: ключи кеша (memcached) должны быть в ASCII без пробелов.
+    return f'group:{quote(slug)}'
+
+
+def author_scope(username):
+    return f'author:{quote(username)}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def pending_comments_scope(post_id, user_id):
+    return f'pending_comments:{post_id}:{user_id}'
+
+
+def post_scopes(post_id, username, *group_slugs):
+    """Области, где виден пост: главная, автор, группы и сам пост."""
+    scopes = [GLOBAL_SCOPE, author_scope(username), post_scope(post_id)]
+    scopes.extend(group_scope(slug) for slug in group_slugs if slug)
+    if any(group_slugs):
+        scopes.append(GROUPS_SCOPE)
+    return scopes
@@ -0,0 +1,328 @@
+"""
+Отложенная запись комментариев (write-behind) для пиковой нагрузки.
+
+При COMMENT_WRITE_BEHIND = 'memory' или 'sqlite' add_comment только
+проверяет форму и кладёт комментарий в очередь: в памяти процесса или
+в отдельном файле SQLite (переживает перезапуск и общий для воркеров).
+Фоновый поток раз в COMMENT_FLUSH_INTERVAL секунд или по набору
+COMMENT_BATCH_SIZE записей пишет пачку одним bulk_create. Пока
+комментарий в очереди, автор видит его на странице поста из кеша
+(pending_for), остальные — после записи.
+
+bulk_create не вызывает сигналы, поэтому счётчики комментариев и
+версии постов обновляются здесь же. Пачка, взятая из очереди SQLite,
+удаляется из неё только после коммита: если процесс упадёт между
+коммитом и удалением, пачка запишется повторно. Если пачка не
+записалась, комментарии пишутся по одному; тот, что не записался
+COMMENT_MAX_ATTEMPTS раз, откладывается (SQLite — в таблицу dead,
+память — только в журнал), чтобы не держать очередь.
+"""
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+
+from . import stats
+from .cache import bump_version, pending_comments_scope, post_scope
+from .models import Comment, Post, User
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'pending_comments:{}:{}'
+# Взятая из SQLite пачка возвращается в очередь, если её не подтвердили.
+LEASE_SECONDS = 60
+
+
+class MemoryQueue:
+    """Очередь в памяти процесса: быстро, но теряется при падении."""
+
+    def __init__(self):
+        self.items = deque()
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        with self.lock:
+            self.items.append(item)
+            return len(self.items)
+
+    def take(self, limit):
+        with self.lock:
+            count = min(limit, len(self.items))
+            return [(None, self.items.popleft()) for _ in range(count)]
+
+    def ack(self, taken):
+        pass
+
+    def release(self, taken):
+        with self.lock:
+            self.items.extendleft(reversed([item for _, item in taken]))
+
+    def bury(self, taken):
+        pass
+
+    def __len__(self):
+        return len(self.items)
+
+
+class SqliteQueue:
+    """Очередь в файле SQLite, общая для процессов одного сервера."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=20,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute('PRAGMA journal_mode = wal')
+            db.execute('CREATE TABLE IF NOT EXISTS pending ('
+                       'id INTEGER PRIMARY KEY, payload TEXT NOT NULL, '
+                       'taken REAL)')
+            db.execute('CREATE TABLE IF NOT EXISTS dead ('
+                       'id INTEGER PRIMARY KEY, payload TEXT NOT NULL)')
+            self._local.db = db
+        return db
+
+    def put(self, item):
+        db = self._db
+        db.execute('INSERT INTO pending (payload) VALUES (?)',
+                   (json.dumps(item),))
+        return db.execute('SELECT COUNT(*) FROM pending '
+                          'WHERE taken IS NULL').fetchone()[0]
+
+    def take(self, limit):
+        db = self._db
+        now = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                'SELECT id, payload FROM pending WHERE taken IS NULL '
+                'OR taken < ? ORDER BY id LIMIT ?',
+                (now - LEASE_SECONDS, limit)).fetchall()
+            db.executemany('UPDATE pending SET taken = ? WHERE id = ?',
+                           [(now, row_id) for row_id, _ in rows])
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, taken):
+        self._db.executemany('DELETE FROM pending WHERE id = ?',
+                             [(row_id,) for row_id, _ in taken])
+
+    def release(self, taken):
+        # Вместе с числом попыток в payload.
+        self._db.executemany(
+            'UPDATE pending SET taken = NULL, payload = ? WHERE id = ?',
+            [(json.dumps(item), row_id) for row_id, item in taken])
+
+    def bury(self, taken):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany('INSERT INTO dead (id, payload) VALUES (?, ?)',
+                           [(row_id, json.dumps(item))
+                            for row_id, item in taken])
+            db.executemany('DELETE FROM pending WHERE id = ?',
+                           [(row_id,) for row_id, _ in taken])
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM pending').fetchone()[0]
+
+
+_queues = {}
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+def enabled():
+    return settings.COMMENT_WRITE_BEHIND != 'off'
+
+
+def get_queue():
+    mode = settings.COMMENT_WRITE_BEHIND
+    key = (mode, settings.COMMENT_QUEUE_PATH if mode == 'sqlite' else None)
+    with _lock:
+        if key not in _queues:
+            _queues[key] = (SqliteQueue(settings.COMMENT_QUEUE_PATH)
+                            if mode == 'sqlite' else MemoryQueue())
+        return _queues[key]
+
+
+def enqueue(post_id, author, text):
+    """Ставит комментарий в очередь и показывает его автору сразу."""
+    item = {
+        'token': uuid.uuid4().hex,
+        'post': post_id,
+        'author': author.pk,
+        'username': author.username,
+        'text': text,
+    }
+    size = get_queue().put(item)
+    _remember(item)
+    _start_flusher()
+    if size >= settings.COMMENT_BATCH_SIZE:
+        _wakeup.set()
+    return item
+
+
+def flush():
+    """Пишет одну пачку из очереди; возвращает размер пачки."""
+    queue = get_queue()
+    taken = queue.take(settings.COMMENT_BATCH_SIZE)
+    if not taken:
+        return 0
+    try:
+        _write([item for _, item in taken])
+    except OperationalError:
+        # База недоступна или занята: записи не виноваты.
+        queue.release(taken)
+        raise
+    except Exception:
+        if len(taken) == 1:
+            _failed(queue, taken)
+            raise
+        logger.exception('Пачка комментариев не записалась, пишем по одному')
+        _write_each(queue, taken)
+    else:
+        queue.ack(taken)
+    return len(taken)
+
+
+def _write_each(queue, taken):
+    # Негодная запись не держит остальные, пока её попытки не кончатся.
+    for index, entry in enumerate(taken):
+        try:
+            _write([entry[1]])
+        except OperationalError:
+            queue.release(taken[index:])
+            raise
+        except Exception:
+            logger.exception('Комментарий %s не записался', entry[1]['token'])
+            _failed(queue, [entry])
+        else:
+            queue.ack([entry])
+
+
+def _failed(queue, taken):
+    retry, dead = [], []
+    for entry in taken:
+        item = entry[1]
+        item['attempts'] = item.get('attempts', 0) + 1
+        if item['attempts'] < settings.COMMENT_MAX_ATTEMPTS:
+            retry.append(entry)
+        else:
+            dead.append(entry)
+    queue.release(retry)
+    if dead:
+        logger.error('Комментарии отложены после %s попыток: %s',
+                     settings.COMMENT_MAX_ATTEMPTS,
+                     [item for _, item in dead])
+        queue.bury(dead)
+        _forget([item for _, item in dead])
+
+
+def _write(items):
+    posts = set(Post.objects.filter(
+        pk__in={item['post'] for item in items}).order_by().values_list(
+        'pk', flat=True))
+    authors = set(User.objects.filter(
+        pk__in={item['author'] for item in items}).order_by().values_list(
+        'pk', flat=True))
+    # Пост или автора могли удалить, пока комментарий ждал в очереди.
+    comments = [Comment(post_id=item['post'], author_id=item['author'],
+                        text=item['text'])
+                for item in items
+                if item['post'] in posts and item['author'] in authors]
+    per_post = Counter(comment.post_id for comment in comments)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        for post_id, count in per_post.items():
+            stats.change_comments(post_id, count)
+    bump_version(*(post_scope(post_id) for post_id in per_post))
+    _forget(items)
+
+
+def _pending_key(post_id, user_id):
+    return PENDING_KEY.format(post_id, user_id)
+
+
+def _remember(item):
+    key = _pending_key(item['post'], item['author'])
+    pending = cache.get(key, [])
+    pending.append(item)
+    cache.set(key, pending, settings.COMMENT_OVERLAY_TIMEOUT)
+    bump_version(pending_comments_scope(item['post'], item['author']))
+
+
+def _forget(items):
+    written = {}
+    for item in items:
+        key = _pending_key(item['post'], item['author'])
+        written.setdefault(key, set()).add(item['token'])
+    bump_version(*(pending_comments_scope(item['post'], item['author'])
+                   for item in items))
+    for key, tokens in written.items():
+        pending = [item for item in cache.get(key, [])
+                   if item['token'] not in tokens]
+        if pending:
+            cache.set(key, pending, settings.COMMENT_OVERLAY_TIMEOUT)
+        else:
+            cache.delete(key)
+
+
+def pending_for(post_id, user):
+    """Комментарии пользователя к посту, которые ещё ждут записи."""
+    if not enabled() or not user.is_authenticated:
+        return []
+    return cache.get(_pending_key(post_id, user.pk), [])
+
+
+def drain():
+    """Пишет всё, что есть в очереди."""
+    while flush():
+        pass
+
+
+def _run():
+    while True:
+        _wakeup.wait(settings.COMMENT_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception('Не удалось записать комментарии из очереди')
+        finally:
+            # У потока свои соединения с базой, их нужно закрыть.
+            connections.close_all()
+
+
+def _start_flusher():
+    global _flusher
+    if not settings.COMMENT_FLUSH_THREAD:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, name='comment-flusher', daemon=True)
+            _flusher.start()
+            # Очередь в памяти иначе пропала бы при остановке процесса.
+            atexit.register(drain)
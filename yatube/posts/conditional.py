@@ -0,0 +1,151 @@
+"""
+Условные ответы для HTML-страниц постов.
+
+ETag строится из версий областей кеша (posts.cache) без обращения
+к базе, поэтому неизменившаяся страница отдаёт 304 ещё до запросов
+к моделям и рендеринга шаблона. Гостям дополнительно ставится
+Cache-Control: public, чтобы страницу мог отдавать обратный прокси.
+
+Last-Modified не ставится: дата не знает о входе и выходе, и по
+If-Modified-Since вернулась бы страница с чужим csrf-токеном в формах.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (add_never_cache_headers,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from core import routers
+
+from .cache import get_versions, version_key
+
+SAFE_METHODS = ('GET', 'HEAD')
+ITEMS_KEY = 'page_items:{}'
+
+
+def _versions(request, scopes, user_scopes, args, kwargs):
+    # Личные области (user_scopes) входят только в ETag, а ключи
+    # фрагментов строятся по scope_versions.
+    if not hasattr(request, 'page_versions'):
+        shared = scopes(request, *args, **kwargs)
+        personal = (user_scopes(request.user, *args, **kwargs)
+                    if user_scopes else [])
+        versions = get_versions(*shared, *personal)
+        request.scope_versions = versions[:len(shared)]
+        request.page_versions = versions
+    return request.page_versions
+
+
+def fragment_context(request):
+    """
+    Срок, версия и источник для фрагментов кеша страницы. Версии
+    областей делают фрагмент устаревшим с первой же записью, поэтому он
+    может жить FRAGMENT_CACHE_TIMEOUT. Отрисованное с отстающей реплики
+    хранится отдельно и недолго: иначе старый снимок закрепился бы
+    в кеше под новой версией.
+    """
+    if settings.DATABASE_REPLICAS and not routers.is_pinned():
+        source, timeout = 'replica', settings.REPLICA_FRAGMENT_CACHE_TIMEOUT
+    else:
+        source, timeout = 'primary', settings.FRAGMENT_CACHE_TIMEOUT
+    return {
+        'fragment_timeout': timeout,
+        'page_version': version_key(request.scope_versions),
+        'page_source': source,
+    }
+
+
+def mark_stale(request):
+    """
+    В страницу попало значение прежней версии (posts.recompute, пока
+    другой запрос его пересчитывает): ответ не кешируется и без ETag.
+    """
+    request.served_stale = True
+
+
+def _page_key(request, versions):
+    session = (request.session.session_key
+               if request.user.is_authenticated else None)
+    key = ':'.join(map(str, [*versions, request.user.pk, session,
+                             request.get_full_path()]))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def versioned_page(scopes, user_scopes=None, per_user=False,
+                   item_scopes=False):
+    """
+    condition() по версиям областей scopes(**kwargs_из_url) и личных
+    областей user_scopes(user, **kwargs_из_url). В ETag входят
+    пользователь, его сессия и строка запроса: страница зависит от них.
+    Сессия меняется при каждом входе, а с ней и csrf-токен в формах.
+
+    per_user — страница целиком своя у каждого пользователя (лента
+    подписок): scopes(user, **kwargs_из_url) задают и версии фрагментов,
+    а сами фрагменты должны различаться по user.id.
+
+    item_scopes — страница-список, у элементов которого свои области
+    (счётчик комментариев поста): view кладёт их в request.item_scopes,
+    и их версии входят в ETag. Состав страницы запоминается в кеше под
+    её версиями, поэтому 304 и здесь обходится без базы.
+    """
+    def page_scopes(request, *args, **kwargs):
+        if per_user:
+            return scopes(request.user, *args, **kwargs)
+        return scopes(*args, **kwargs)
+
+    def etag(request, *args, **kwargs):
+        versions = _versions(request, page_scopes, user_scopes, args,
+                             kwargs)
+        if item_scopes:
+            return _items_etag(request, versions)
+        return _page_key(request, versions)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(request, 'served_stale', False):
+                del response['ETag']
+                add_never_cache_headers(response)
+            elif request.method in SAFE_METHODS:
+                if item_scopes and not response.has_header('ETag'):
+                    _remember_items(request, response)
+                _patch_cache_headers(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _items_etag(request, versions):
+    items = cache.get(ITEMS_KEY.format(_page_key(request, versions)))
+    if items is None:
+        # Состав страницы ещё не известен: ETag поставит _remember_items.
+        return None
+    return _page_key(request, [*versions, *get_versions(*items)])
+
+
+def _remember_items(request, response):
+    items = getattr(request, 'item_scopes', None)
+    if items is None or response.status_code != 200:
+        return
+    versions = request.page_versions
+    cache.set(ITEMS_KEY.format(_page_key(request, versions)), items,
+              fragment_context(request)['fragment_timeout'])
+    response['ETag'] = quote_etag(
+        _page_key(request, [*versions, *get_versions(*items)]))
+
+
+def _patch_cache_headers(request, response):
+    if request.user.is_authenticated:
+        # Личные страницы браузер хранит сам и всегда перепроверяет.
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True,
+                            max_age=settings.ANONYMOUS_CACHE_SECONDS)
+    patch_vary_headers(response, ('Cookie',))
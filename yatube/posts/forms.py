@@ -1,8 +1,19 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
 from . models import Post, Comment
+from .uploads import check_pixels, strip_metadata
 
 
 class PostForm(forms.ModelForm):
+    def clean_image(self):
+        # Файл сверх лимита отклоняет ещё ImageField (posts.uploads).
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            check_pixels(image)
+            return strip_metadata(image)
+        return image
+
     class Meta():
         model = Post
         fields = ('text', 'group', 'image')
@@ -0,0 +1,87 @@
+"""
+Каталог групп и рейтинг «набирают популярность».
+
+Счётчики каталога (GroupStats) сдвигают сигналы, поэтому странице не
+нужен COUNT(*) по постам. Рейтинг — сумма вкладов постов и комментариев
+за TRENDING_WINDOW_DAYS, каждый вклад вдвое слабеет за
+TRENDING_HALF_LIFE_HOURS. Его пересчитывает периодическая задача
+(posts.tasks.refresh_trending) в таблицу TrendingGroup, а страница
+только читает готовые строки.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import GROUPS_SCOPE, bump_version
+from .models import Comment, Group, Post, TrendingGroup
+
+PREVIEW_SIZE = 3
+
+
+def with_previews(groups, size=PREVIEW_SIZE):
+    """
+    Группы с последними size постами в group.preview. Все превью — один
+    запрос: по подзапросу IN (... LIMIT size) на группу, каждый идёт по
+    индексу (group, -pub_date), а не по всем постам групп.
+    """
+    groups = list(groups)
+    previews = defaultdict(list)
+    condition = Q()
+    for group in groups:
+        condition |= Q(id__in=Post.objects.filter(group=group).order_by(
+            '-pub_date', '-id').values('id')[:size])
+    if groups:
+        for post in Post.objects.for_feed().filter(condition).order_by(
+                '-pub_date', '-id'):
+            previews[post.group_id].append(post)
+    for group in groups:
+        group.preview = previews[group.id]
+    return groups
+
+
+def trending(size=None):
+    """Готовый рейтинг групп из TrendingGroup."""
+    return TrendingGroup.objects.select_related('group')[
+        :size or settings.TRENDING_SIZE]
+
+
+def trending_scores(now=None):
+    """Затухающие оценки активности групп: {group_id: score}."""
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    decay = math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+    sources = (
+        (Post.objects.filter(pub_date__gte=since, group__isnull=False)
+         .values_list('group_id', 'pub_date'), 1.0),
+        (Comment.objects.filter(created__gte=since,
+                                post__group__isnull=False)
+         .values_list('post__group_id', 'created'),
+         settings.TRENDING_COMMENT_WEIGHT),
+    )
+    scores = defaultdict(float)
+    for rows, weight in sources:
+        for group_id, moment in rows.iterator(chunk_size=2000):
+            age = max((now - moment).total_seconds(), 0)
+            scores[group_id] += weight * math.exp(-decay * age)
+    return scores
+
+
+def refresh_trending(now=None):
+    """Пересчитывает таблицу TrendingGroup целиком; возвращает её размер."""
+    now = now or timezone.now()
+    scores = trending_scores(now)
+    # Группу могли удалить, пока шёл подсчёт.
+    existing = Group.objects.filter(pk__in=list(scores)).values_list(
+        'pk', flat=True)
+    rows = [TrendingGroup(group_id=group_id, score=scores[group_id],
+                          computed=now) for group_id in existing]
+    with transaction.atomic():
+        TrendingGroup.objects.all().delete()
+        TrendingGroup.objects.bulk_create(rows)
+    bump_version(GROUPS_SCOPE)
+    return len(rows)
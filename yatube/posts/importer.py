@@ -0,0 +1,356 @@
+"""
+Импорт контента из других площадок (команда import_posts).
+
+Вход — JSONL или CSV, по записи на строку. Поле type задаёт вид записи
+(по умолчанию post):
+
+* post: id (внешний, для ссылок из комментариев), author, text,
+  group (slug), pub_date (ISO 8601), image (путь к файлу);
+* comment: post (внешний id поста из этого же импорта), author, text,
+  created;
+* follow: user, author.
+
+Записи идут конвейером генераторов: чтение -> пачки -> запись пачки
+через bulk_create в отдельной транзакции. Авторы и группы берутся из
+кеша в памяти, который догружается одним запросом на пачку. Картинки
+копируются в хранилище пулом потоков, миниатюры ставятся в очередь
+после коммита. bulk_create не вызывает сигналы, поэтому поисковый
+индекс, ленты и счётчики обновляются здесь же.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import thumbnails, timeline
+from .cache import (GLOBAL_SCOPE, GROUPS_SCOPE, author_scope, bump_version,
+                    follow_feed_scope, group_scope, post_scope)
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+from .stats import recount_groups, recount_many
+
+POST = 'post'
+COMMENT = 'comment'
+FOLLOW = 'follow'
+KINDS = (POST, COMMENT, FOLLOW)
+MAX_ERRORS_KEPT = 100
+# bulk_update строит CASE по всем строкам пачки: на больших пачках
+# он растёт квадратично, поэтому даты правятся кусками поменьше.
+DATE_UPDATE_BATCH = 100
+
+
+class RecordError(ValueError):
+    """Запись не может быть импортирована."""
+
+
+def read_rows(stream, fmt):
+    """(номер строки, dict) из JSONL или CSV."""
+    if fmt == 'csv':
+        # Первая строка CSV — заголовок.
+        for number, row in enumerate(csv.DictReader(stream), 2):
+            yield number, {key: value for key, value in row.items() if value}
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class LookupCache:
+    """Объекты по ключу; промахи догружаются одним запросом на пачку."""
+
+    def __init__(self, queryset, field, create=None):
+        self.queryset = queryset
+        self.field = field
+        self.create = create
+        self.values = {}
+
+    def prime(self, keys):
+        missing = {key for key in keys if key} - self.values.keys()
+        if not missing:
+            return
+        for obj in self.queryset.filter(**{f'{self.field}__in': missing}):
+            self.values[getattr(obj, self.field)] = obj
+        for key in missing - self.values.keys():
+            self.values[key] = None
+
+    def get(self, key):
+        self.prime([key])
+        value = self.values[key]
+        if value is None and self.create is not None:
+            value = self.values[key] = self.create(key)
+        return value
+
+
+def _date(value):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise RecordError(f'неверная дата {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _returns_ids():
+    features = connection.features
+    return getattr(features, 'can_return_rows_from_bulk_insert', getattr(
+        features, 'can_return_ids_from_bulk_insert', False))
+
+
+def _lock_for_write(model):
+    """
+    Берёт блокировку записи SQLite в текущей транзакции: UPDATE без
+    строк ничего не меняет, но другие писатели теперь ждут её конца.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {table} SET {column} = {column} WHERE 0')
+
+
+def _assign_ids(model, objs):
+    """
+    Назначает первичные ключи сами, если база не возвращает их из
+    bulk_create (SQLite): они нужны для ссылок и исправления дат.
+    Вызывается в транзакции: до чтения MAX(pk) берётся блокировка
+    записи, иначе параллельная вставка заняла бы те же ключи.
+    """
+    if _returns_ids() or not objs:
+        return
+    _lock_for_write(model)
+    start = model.objects.aggregate(top=Max('pk'))['top'] or 0
+    for offset, obj in enumerate(objs, 1):
+        obj.pk = start + offset
+
+
+def _bulk_create(model, objs, date_field):
+    """bulk_create и исправление дат: auto_now_add перезаписывает их."""
+    dates = [getattr(obj, date_field) for obj in objs]
+    _assign_ids(model, objs)
+    model.objects.bulk_create(objs)
+    dated = []
+    for obj, value in zip(objs, dates):
+        if value is not None:
+            setattr(obj, date_field, value)
+            dated.append(obj)
+    if dated:
+        model.objects.bulk_update(dated, [date_field],
+                                  batch_size=DATE_UPDATE_BATCH)
+
+
+class Importer:
+    def __init__(self, media_source='', create_users=False,
+                 create_groups=False, workers=4):
+        self.media_source = media_source
+        self.users = LookupCache(
+            User.objects.only('id', 'username'), 'username',
+            self._create_user if create_users else None)
+        self.groups = LookupCache(
+            Group.objects.only('id', 'title', 'slug'), 'slug',
+            self._create_group if create_groups else None)
+        self.post_ids = {}
+        self.workers = workers
+        self.executor = None
+        self.counts = dict.fromkeys(KINDS + ('errors', 'rows'), 0)
+        self.errors = []
+        self.touched_users = set()
+        self.touched_posts = set()
+        self.touched_groups = set()
+
+    @staticmethod
+    def _create_user(username):
+        return User.objects.create_user(username=username)
+
+    @staticmethod
+    def _create_group(slug):
+        return Group.objects.create(title=slug, slug=slug, description='')
+
+    def _user(self, username):
+        user = self.users.get(username) if username else None
+        if user is None:
+            raise RecordError(f'неизвестный пользователь {username!r}')
+        return user
+
+    def _group(self, slug):
+        if not slug:
+            return None
+        group = self.groups.get(slug)
+        if group is None:
+            raise RecordError(f'неизвестная группа {slug!r}')
+        return group
+
+    def _copy_image(self, path):
+        source = os.path.join(self.media_source, path)
+        name = Post._meta.get_field('image').generate_filename(
+            None, os.path.basename(path))
+        with open(source, 'rb') as file:
+            return default_storage.save(name, File(file))
+
+    def _build_post(self, row):
+        if not row.get('text'):
+            raise RecordError('пустой текст')
+        return Post(author=self._user(row.get('author')),
+                    group=self._group(row.get('group')),
+                    text=row['text'], pub_date=_date(row.get('pub_date')))
+
+    def _build_comment(self, row):
+        post_id = self.post_ids.get(str(row.get('post')))
+        if post_id is None:
+            raise RecordError(f'неизвестный пост {row.get("post")!r}')
+        if not row.get('text'):
+            raise RecordError('пустой текст')
+        return Comment(post_id=post_id, author=self._user(row.get('author')),
+                       text=row['text'], created=_date(row.get('created')))
+
+    def _build_follow(self, row):
+        user = self._user(row.get('user'))
+        author = self._user(row.get('author'))
+        if user.pk == author.pk:
+            raise RecordError('подписка на себя')
+        return Follow(user=user, author=author)
+
+    def _split(self, batch):
+        """Раскладывает пачку по видам записей, отбрасывая ошибочные."""
+        rows = [row for _, row in batch if isinstance(row, dict)]
+        self.users.prime(value for row in rows
+                         for value in (row.get('author'), row.get('user')))
+        self.groups.prime(row.get('group') for row in rows)
+        builders = {POST: self._build_post, COMMENT: self._build_comment,
+                    FOLLOW: self._build_follow}
+        objs = {kind: [] for kind in KINDS}
+        for number, row in batch:
+            try:
+                if not isinstance(row, dict):
+                    raise RecordError('не удалось разобрать строку')
+                kind = row.get('type', POST)
+                if kind not in builders:
+                    raise RecordError(f'неизвестный тип {kind!r}')
+                if kind == COMMENT:
+                    # Комментарий может ссылаться на пост из этой же пачки.
+                    objs[COMMENT].append((number, row))
+                    continue
+                objs[kind].append((row, builders[kind](row)))
+            except RecordError as error:
+                self._error(number, error)
+        return objs
+
+    def _error(self, number, error):
+        self.counts['errors'] += 1
+        if len(self.errors) < MAX_ERRORS_KEPT:
+            self.errors.append(f'строка {number}: {error}')
+
+    def _attach_images(self, posts):
+        jobs = [(post, row['image']) for row, post in posts
+                if row.get('image')]
+        if not jobs:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='import')
+        futures = [self.executor.submit(self._copy_image, path)
+                   for _, path in jobs]
+        for (post, path), future in zip(jobs, futures):
+            try:
+                post.image = future.result()
+            except OSError as error:
+                self._error('-', f'картинка {path!r}: {error}')
+
+    def write_batch(self, batch):
+        objs = self._split(batch)
+        posts = objs[POST]
+        self._attach_images(posts)
+        with transaction.atomic():
+            _bulk_create(Post, [post for _, post in posts], 'pub_date')
+            for row, post in posts:
+                if row.get('id') is not None:
+                    self.post_ids[str(row['id'])] = post.pk
+            comments = []
+            for number, row in objs[COMMENT]:
+                try:
+                    comments.append(self._build_comment(row))
+                except RecordError as error:
+                    self._error(number, error)
+            _bulk_create(Comment, comments, 'created')
+            follows = [follow for _, follow in objs[FOLLOW]]
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            self._after_write([post for _, post in posts], follows)
+        for _, post in posts:
+            if post.image:
+                transaction.on_commit(
+                    lambda name=post.image.name: thumbnails.schedule(name))
+        self.counts[POST] += len(posts)
+        self.counts[COMMENT] += len(comments)
+        self.counts[FOLLOW] += len(follows)
+        self.touched_posts.update(comment.post_id for comment in comments)
+
+    def _after_write(self, posts, follows):
+        """То, что для одиночных записей делают сигналы."""
+        get_backend().index(posts)
+        for post in posts:
+            timeline.fan_out(post)
+        for follow in follows:
+            timeline.backfill(follow.user_id, follow.author_id)
+        self.touched_users.update(post.author_id for post in posts)
+        self.touched_groups.update(
+            post.group.slug for post in posts if post.group_id)
+        for follow in follows:
+            self.touched_users.update((follow.user_id, follow.author_id))
+
+    def finish(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        recount_many(self.touched_users, self.touched_posts)
+        if self.touched_groups:
+            recount_groups(Group.objects.filter(slug__in=self.touched_groups))
+        followers = Follow.objects.filter(
+            author_id__in=self.touched_users).values_list(
+            'user_id', flat=True).distinct()
+        usernames = User.objects.filter(
+            pk__in=self.touched_users).values_list('username', flat=True)
+        bump_version(
+            GLOBAL_SCOPE,
+            *(follow_feed_scope(user_id) for user_id in
+              set(followers) | self.touched_users),
+            *(author_scope(username) for username in usernames),
+            *(group_scope(slug) for slug in self.touched_groups),
+            *([GROUPS_SCOPE] if self.touched_groups else []),
+            *(post_scope(post_id) for post_id in self.touched_posts),
+        )
+
+    def run(self, rows, batch_size=1000, progress=None):
+        started = time.monotonic()
+        try:
+            for batch in batched(rows, batch_size):
+                self.counts['rows'] += len(batch)
+                self.write_batch(batch)
+                if progress is not None:
+                    elapsed = time.monotonic() - started
+                    progress(self.counts, self.counts['rows'] / max(
+                        elapsed, 1e-6))
+        finally:
+            self.finish()
+        return self.counts
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.models import Comment, Post, User
+from posts.paginator import (COMMENT_ORDERING, NUM_OF_COMMENTS, NUM_OF_POSTS,
+                             CursorPaginator)
+from posts.timeline import follow_posts
+
+
+def feed_querysets():
+    """Запросы, которые выполняют представления лент."""
+    user = User(id=0)
+    feeds = {
+        'index': Post.objects.for_feed(),
+        'group_posts': Post.objects.for_feed().filter(group_id=0),
+        'profile': Post.objects.for_feed().filter(author_id=0),
+        'follow_index': follow_posts(user),
+    }
+    for name, queryset in feeds.items():
+        paginator = CursorPaginator(queryset, NUM_OF_POSTS)
+        yield name, paginator.object_list[:NUM_OF_POSTS + 1]
+        seek = paginator._seek([timezone.now(), 0], after=True)
+        yield (f'{name} (cursor)',
+               paginator.object_list.filter(seek)[:NUM_OF_POSTS + 1])
+    yield 'post_detail', Post.objects.filter(pk=0)
+    comments = CursorPaginator(
+        Comment.objects.filter(post_id=0).select_related('author'),
+        NUM_OF_COMMENTS, ordering=COMMENT_ORDERING)
+    yield ('post_detail (comments)',
+           comments.object_list[:NUM_OF_COMMENTS + 1])
+    seek = comments._seek([timezone.now(), 0], after=True)
+    yield ('post_detail (comments, cursor)',
+           comments.object_list.filter(seek)[:NUM_OF_COMMENTS + 1])
+
+
+def full_scans(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[-1] for row in cursor.fetchall()]
+    return [
+        detail for detail in details
+        if detail.startswith('SCAN') and 'USING' not in detail
+    ], details
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN QUERY PLAN для запросов лент и завершается '
+            'с ошибкой, если какой-то из них читает таблицу целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plan', action='store_true',
+                            help='Печатать план каждого запроса.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только '
+                               'для SQLite.')
+        failed = []
+        for name, queryset in feed_querysets():
+            scans, details = full_scans(queryset)
+            if options['verbose_plan']:
+                for detail in details:
+                    self.stdout.write(f'  {name}: {detail}')
+            if scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: полный просмотр — {"; ".join(scans)}'))
+            else:
+                self.stdout.write(f'{name}: OK')
+        if failed:
+            raise CommandError(
+                f'Полный просмотр таблицы в запросах: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы лент используют '
+                                             'индексы.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import (FORMATS, KINDS, export_records, parse_since,
+                            render)
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии и подписки в NDJSON '
+            'или CSV (формат import_posts).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', nargs='+', choices=KINDS,
+                            default=list(KINDS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--since',
+            help='Только записи новее этого момента (ISO 8601, по '
+                 'pub_date постов и created комментариев).')
+        parser.add_argument('--output', help='Файл; по умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since'])
+        except ValueError as error:
+            raise CommandError(error)
+        records = export_records(options['kinds'], since,
+                                 options['chunk_size'])
+        lines = render(records, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
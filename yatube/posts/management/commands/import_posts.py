@@ -0,0 +1,56 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты, комментарии и подписки из JSONL или CSV '
+            'пачками bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL или CSV.')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла; по умолчанию по расширению.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--media-source', default='',
+            help='Каталог, относительно которого заданы пути картинок.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоки для копирования картинок.')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Создавать неизвестных пользователей.')
+        parser.add_argument('--create-groups', action='store_true',
+                            help='Создавать неизвестные группы.')
+
+    def progress(self, counts, rate):
+        self.stdout.write(
+            f"Строк: {counts['rows']}, постов: {counts['post']}, "
+            f"комментариев: {counts['comment']}, "
+            f"подписок: {counts['follow']}, ошибок: {counts['errors']}, "
+            f'{rate:.0f} строк/с')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        importer = Importer(
+            media_source=options['media_source'],
+            create_users=options['create_users'],
+            create_groups=options['create_groups'],
+            workers=options['workers'],
+        )
+        with open(path, encoding='utf-8', newline='') as stream:
+            counts = importer.run(read_rows(stream, fmt),
+                                  batch_size=options['batch_size'],
+                                  progress=self.progress)
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано постов: {counts['post']}, "
+            f"комментариев: {counts['comment']}, "
+            f"подписок: {counts['follow']}, ошибок: {counts['errors']}"))
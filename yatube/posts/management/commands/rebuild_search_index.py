@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс постов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        backend = get_backend()
+        backend.clear()
+        posts = Post.objects.select_related('group').only(
+            'id', 'text', 'group', 'group__title').order_by('id')
+        batch = []
+        total = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            batch.append(post)
+            if len(batch) >= batch_size:
+                backend.index(batch)
+                total += len(batch)
+                batch = []
+                self.stdout.write(f'Проиндексировано постов: {total}')
+        backend.index(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересобран, постов: {total}'))
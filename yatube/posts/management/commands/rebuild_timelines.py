@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow
+from posts.timeline import get_mode, PULL, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок (TimelineEntry).'
+
+    def handle(self, *args, **options):
+        if get_mode() == PULL:
+            self.stdout.write('TIMELINE_MODE = pull, ленты не используются.')
+            return
+        users = Follow.objects.values_list('user_id', flat=True).distinct()
+        total = 0
+        for user_id in users.iterator():
+            rebuild(user_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {total}'))
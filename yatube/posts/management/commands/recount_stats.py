@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики авторов и '
+            'комментариев, исправляя расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users, posts = recount_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано авторов: {users}, постов: {posts}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.groups import refresh_trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг групп. Обычно это делают воркеры '
+            '(run_workers) раз в TRENDING_INTERVAL секунд.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Групп в рейтинге: {refresh_trending()}')
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import compare, run
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95/p99 и число SQL-запросов страниц posts и '
+            'сравнивает результат с эталоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument(
+            '--only', nargs='*', help='Имена страниц для замера.')
+        parser.add_argument('--output', help='Куда записать JSON-отчёт.')
+        parser.add_argument('--baseline', help='JSON-отчёт эталона.')
+        parser.add_argument('--tolerance', type=float, default=0.25)
+        parser.add_argument('--min-delta-ms', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        try:
+            report = run(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                cold=options['cold'],
+                only=options['only'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<16} p50 {result['p50_ms']:>9.2f} мс  "
+                f"p95 {result['p95_ms']:>9.2f} мс  "
+                f"p99 {result['p99_ms']:>9.2f} мс  "
+                f"запросов {result['queries']}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = compare(report, baseline, options['tolerance'],
+                                  options['min_delta_ms'])
+            if regressions:
+                raise CommandError(
+                    'Регрессии относительно эталона:\n'
+                    + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,34 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import cache_tiers, run_cache
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает латентность попаданий в кеш: память процесса, '
+            'файлы, SQLite, Redis и двухуровневый кеш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=200)
+        parser.add_argument('--size', type=int, default=4096,
+                            help='Размер значения в байтах.')
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--redis', help='URL Redis, если он есть.')
+        parser.add_argument('--output', help='Куда записать JSON-отчёт.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            report = run_cache(cache_tiers(directory, options['redis']),
+                               options['keys'], options['size'],
+                               options['rounds'])
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<14} попадание p50 {result['hit_p50_us']:>8.1f} мкс"
+                f"  p95 {result['hit_p95_us']:>8.1f} мкс  "
+                f"промах p50 {result['miss_p50_us']:>8.1f} мкс  "
+                f"{result['hits_per_second']:>8}/с")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
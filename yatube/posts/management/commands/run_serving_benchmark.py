@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import run_serving
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность страниц posts через WSGI '
+            'и ASGI под одновременной нагрузкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Сколько клиентов шлют запросы разом.')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Воркеров WSGI и потоков ASGI, поровну '
+                 '(по умолчанию ASGI_THREADS).')
+        parser.add_argument(
+            '--db-latency-ms', type=float, default=0,
+            help='Задержка каждого SQL-запроса, как у базы по сети.')
+        parser.add_argument(
+            '--only', nargs='*', help='Имена страниц для замера.')
+        parser.add_argument('--output', help='Куда записать JSON-отчёт.')
+
+    def handle(self, *args, **options):
+        try:
+            report = run_serving(
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                workers=options['workers'],
+                only=options['only'],
+                latency_ms=options['db_latency_ms'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f"воркеров и потоков: {report['workers']}, "
+            f"клиентов: {report['concurrency']}")
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<5} {result['requests_per_second']:>8.1f} запр/с  "
+                f"p50 {result['p50_ms']:>9.2f} мс  "
+                f"p95 {result['p95_ms']:>9.2f} мс  "
+                f"p99 {result['p99_ms']:>9.2f} мс")
+        wsgi, asgi = (report['results'][name]['requests_per_second']
+                      for name in ('wsgi', 'asgi'))
+        self.stdout.write(f'asgi/wsgi: {asgi / wsgi:.2f}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу большим набором данных для бенчмарка '
+            '(bulk_create, без сигналов).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён пользователей и slug групп.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            comments=options['comments'],
+            batch_size=options['batch_size'],
+            prefix=options['prefix'],
+            random_seed=options['seed'],
+            log=self.stdout.write,
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS('Данные для бенчмарка готовы'))
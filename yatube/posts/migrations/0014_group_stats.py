@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    posts = Post.objects.filter(group=models.OuterRef('pk')).order_by()
+    groups = Group.objects.annotate(
+        posts_total=Coalesce(models.Subquery(
+            posts.values('group').annotate(
+                total=models.Count('pk')).values('total')[:1]), 0),
+        last_post=models.Subquery(
+            posts.order_by('-pub_date').values('pub_date')[:1]),
+    ).values_list('pk', 'posts_total', 'last_post')
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=group_id, posts_count=total,
+                    last_post_at=last_post)
+         for group_id, total, last_post in groups.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingGroup',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Group')),
+                ('score', models.FloatField()),
+                ('computed', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created'], name='comment_created'),
+        ),
+        migrations.AddIndex(
+            model_name='trendinggroup',
+            index=models.Index(fields=['-score'], name='trending_score'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
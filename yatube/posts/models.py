@@ -4,6 +4,20 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 forStr = 15
 
+# Поля, которые шаблоны лент читают у поста, автора и группы.
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'author', 'group',
+    'author__id', 'author__username',
+    'author__first_name', 'author__last_name',
+    'group__id', 'group__title', 'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
 
 class Post(models.Model):
     text = models.TextField("Текст публикации")
@@ -25,12 +39,22 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:forStr]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date'),
+        ]
 
 
 class Group(models.Model):
@@ -63,6 +87,13 @@ class Comment(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created'),
+            models.Index(fields=['created'], name='comment_created'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -76,6 +107,86 @@ class Follow(models.Model):
         related_name='following'
     )
 
-    constraints = [
-        models.UniqueConstraint(fields=['user', 'author'], name='unique')
-    ]
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow')
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора, обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count}'
+
+
+class GroupStats(models.Model):
+    """Число постов группы и время последнего, обновляются сигналами."""
+    group = models.OneToOneField(
+        Group,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.group_id}: {self.posts_count}'
+
+
+class TrendingGroup(models.Model):
+    """Рейтинг групп по затухающей активности; таблицу пересчитывает задача."""
+    group = models.OneToOneField(
+        Group,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='trending'
+    )
+    score = models.FloatField()
+    computed = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.group_id}: {self.score:.3f}'
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_pub_date'),
+        ]
@@ -0,0 +1,129 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+NUM_OF_POSTS = 10
+NUM_OF_COMMENTS = 20
+NUM_OF_GROUPS = 20
+DEFAULT_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """
+    Паджинатор по ключу (keyset): вместо OFFSET и COUNT(*) следующая
+    страница выбирается условием «после последней записи» по паре полей
+    ordering, например (pub_date, id).
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING,
+                 **kwargs):
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs)
+
+    def encode_cursor(self, obj, direction, number):
+        values = [
+            self._field(name).value_to_string(obj) for name in self.fields
+        ]
+        raw = json.dumps([direction, number] + values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, number, *values = json.loads(raw.decode())
+            if direction not in ('next', 'prev') or len(values) != len(
+                    self.fields):
+                raise ValueError
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+            return direction, int(number), values
+        except (ValueError, TypeError, UnicodeDecodeError,
+                ValidationError) as error:
+            raise InvalidCursor(cursor) from error
+
+    def cursor_page(self, cursor=None):
+        """Возвращает страницу после (или до) записи из курсора."""
+        if not cursor:
+            return self._build_page(
+                list(self.object_list[:self.per_page + 1]), 1, 'next', False)
+        direction, number, values = self.decode_cursor(cursor)
+        forward = direction == 'next'
+        queryset = self.object_list.filter(
+            self._seek(values, after=forward))
+        if not forward:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        return self._build_page(rows, number, direction, True)
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: битый курсор ведёт на первую страницу."""
+        try:
+            return self.cursor_page(cursor)
+        except InvalidCursor:
+            return self.cursor_page()
+
+    def _build_page(self, rows, number, direction, from_cursor):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, from_cursor
+        page = Page(rows, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor(rows[-1], 'next',
+                                                  number + 1)
+        if rows and has_previous:
+            page.previous_cursor = self.encode_cursor(rows[0], 'prev',
+                                                      max(number - 1, 1))
+        return page
+
+    def _seek(self, values, after):
+        """Условие «строго после/до» для составного ключа."""
+        lookup = 'lt' if self.descending == after else 'gt'
+        condition = Q()
+        for index, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_name, prev_value in zip(self.fields[:index],
+                                             values[:index]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+
+def paginate(request, queryset, per_page=NUM_OF_POSTS, count=None):
+    """
+    Страница ленты для шаблона includes/paginator.html.
+
+    Старые ссылки вида ?page=N обслуживаются обычным Paginator,
+    всё остальное — курсорами ?cursor=. count() подменяет COUNT(*)
+    обычного Paginator, например значением из кеша.
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = Paginator(queryset, per_page)
+        if count is not None:
+            paginator.count = count()
+        return paginator.get_page(page_number)
+    return CursorPaginator(queryset, per_page).get_page(
+        request.GET.get('cursor'))
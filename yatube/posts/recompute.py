@@ -0,0 +1,117 @@
+"""
+Дорогие значения в кеше без лавины пересчётов.
+
+Значение лежит под постоянным ключом вместе с версией, сроком и
+временем последнего пересчёта. Когда оно устарело (сменилась версия
+или вышел срок), пересчитывает один запрос — тот, что взял замок в
+кеше; остальные тем временем получают прежнее значение. Незадолго до
+срока пересчёт может начаться заранее, с вероятностью тем большей, чем
+ближе срок и дольше сам пересчёт (XFetch), поэтому значение обычно
+обновляется раньше, чем истечёт у всех сразу.
+
+Запросы, которые читают из основной базы после собственной записи,
+устаревшего не получают: они пересчитывают сами. С strict_version
+значение прежней версии отдаётся, только если вызывающий может
+пометить ответ как временный (on_stale): страница с ним уходит без
+ETag и с no-store (posts.conditional), иначе 304 по ETag новой версии
+закрепил бы у клиента старое тело. Без on_stale остальные ждут
+пересчёта до STAMPEDE_LOCK_WAIT секунд.
+
+Записи и их замки держит только общий кеш (SHARED_ONLY в TieredCache):
+иначе каждый процесс видел бы свою копию и пересчитывал бы сам.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import routers
+from core.metrics import registry
+
+LOCK_KEY = '{}:lock'
+POLL_SECONDS = 0.025
+
+
+def _valid(entry, version, now):
+    return entry is not None and entry[1] == version and now < entry[2]
+
+
+def _expires_early(entry, now):
+    # XFetch: -log(random) ~ Exp(1), досрочно с вероятностью exp(-gap/delta).
+    _, _, expires, delta = entry
+    early = delta * settings.STAMPEDE_BETA * -math.log(1 - random.random())
+    return now + early >= expires
+
+
+def _recompute(key, compute, timeout, version, name):
+    registry.count('yatube_recompute_total', name)
+    start = time.time()
+    value = compute()
+    now = time.time()
+    entry = (value, version, now + timeout, now - start)
+    cache.set(key, entry, timeout + settings.STAMPEDE_STALE_SECONDS)
+    return value
+
+
+def _wait(key, version, deadline):
+    """Ждёт значение, которое пересчитывает другой запрос."""
+    while time.time() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry
+    return None
+
+
+def _servable(entry, version, strict_version, on_stale):
+    """Можно ли отдать entry, пока значение пересчитывает другой запрос."""
+    if entry is None:
+        return False
+    if entry[1] == version or not strict_version:
+        return True
+    if on_stale is None:
+        return False
+    on_stale()
+    return True
+
+
+def cached(key, compute, timeout, version=None, name='value',
+           stale_ok=None, strict_version=False, on_stale=None):
+    """
+    compute() из кеша по ключу key; пересчёт при смене version или
+    через timeout секунд. name — метка в метриках /metrics/.
+    strict_version запрещает отдавать значение другой версии, если нет
+    on_stale(): тогда он вызывается перед тем, как отдать прежнее.
+    """
+    if stale_ok is None:
+        stale_ok = not routers.is_pinned()
+    now = time.time()
+    entry = cache.get(key)
+    valid = _valid(entry, version, now)
+    if valid and not _expires_early(entry, now):
+        return entry[0]
+    if entry is not None and not valid and not stale_ok:
+        return _recompute(key, compute, timeout, version, name)
+    lock_key = LOCK_KEY.format(key)
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, settings.STAMPEDE_LOCK_TIMEOUT):
+        try:
+            if valid:
+                registry.count('yatube_recompute_early_total', name)
+            return _recompute(key, compute, timeout, version, name)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+    registry.count('yatube_recompute_coalesced_total', name)
+    if _servable(entry, version, strict_version, on_stale):
+        if not valid:
+            registry.count('yatube_recompute_stale_total', name)
+        return entry[0]
+    entry = _wait(key, version, now + settings.STAMPEDE_LOCK_WAIT)
+    if entry is not None:
+        return entry[0]
+    # Пересчёт в другом запросе затянулся: не ждём его дольше.
+    return _recompute(key, compute, timeout, version, name)
@@ -0,0 +1,175 @@
+"""
+Полнотекстовый поиск по постам (текст поста и название группы).
+
+Бэкенд выбирается настройкой SEARCH_BACKEND. По умолчанию это индекс
+SQLite FTS5 (таблица posts_post_fts, rowid = id поста), который сигналы
+Post/Group держат в актуальном состоянии; DatabaseSearchBackend — запасной
+вариант на LIKE для баз без FTS5.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(query):
+    return WORD_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    def index(self, posts):
+        """Добавляет или обновляет посты в индексе."""
+
+    def remove(self, post_ids):
+        """Убирает посты из индекса."""
+
+    def clear(self):
+        """Очищает индекс целиком."""
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def search_ids(self, query, offset, limit):
+        """id постов по убыванию релевантности."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Оставляет в queryset только найденные посты."""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Поиск через LIKE: индекс не нужен, но каждый запрос — полный скан."""
+
+    def _matches(self, query):
+        condition = Q()
+        for word in tokenize(query):
+            condition &= (Q(text__icontains=word)
+                          | Q(group__title__icontains=word))
+        return Post.objects.filter(condition)
+
+    def count(self, query):
+        return self._matches(query).count()
+
+    def search_ids(self, query, offset, limit):
+        return list(self._matches(query).values_list(
+            'id', flat=True)[offset:offset + limit])
+
+    def filter(self, queryset, query):
+        return queryset.filter(id__in=self._matches(query).values('id'))
+
+
+class SqliteFTSBackend(BaseSearchBackend):
+    """Инвертированный индекс SQLite FTS5 с ранжированием bm25."""
+    # Веса колонок для bm25: текст поста важнее названия группы.
+    weights = (1.0, 0.5)
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово в кавычках: пользовательский ввод не может
+        # сломать синтаксис MATCH; звёздочка — поиск по префиксу.
+        return ' '.join(f'"{word}"*' for word in tokenize(query))
+
+    def index(self, posts):
+        rows = [
+            (post.id, post.text, post.group.title if post.group else '')
+            for post in posts
+        ]
+        if not rows:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_title) '
+                f'VALUES (%s, %s, %s)', rows)
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(post_id,) for post_id in post_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def count(self, query):
+        match = self.match_expression(query)
+        if not match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [match])
+            return cursor.fetchone()[0]
+
+    def search_ids(self, query, offset, limit):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC '
+                f'LIMIT %s OFFSET %s', [match, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match]))
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _load_backend(settings.SEARCH_BACKEND)
+
+
+class SearchResults:
+    """Ленивая выдача для Paginator: считает и режет страницы в индексе."""
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = self.count() if key.stop is None else key.stop
+        ids = self.backend.search_ids(self.query, start, stop - start)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search(query):
+    return SearchResults(query)
@@ -0,0 +1,216 @@
+"""
+Реакция на запись моделей: версии кеша, счётчики, ленты и поиск.
+
+Версии сдвигаются через bump_on_commit: области вычисляются сразу (объект
+к фиксации может быть уже удалён), а сам сдвиг ждёт конца транзакции.
+"""
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import stats, tasks, timeline
+from .cache import (GLOBAL_SCOPE, GROUPS_SCOPE, author_scope, bump_on_commit,
+                    follow_feed_scope, group_scope, post_scope, post_scopes)
+from .models import Comment, Follow, Group, GroupStats, Post, User
+from .search import get_backend
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_followers_feeds(sender, instance, created=False, **kwargs):
+    """
+    Изменённый или удалённый пост меняет ленты подписчиков: у автора их
+    может быть много, поэтому версии сдвигает задача. Новый пост
+    раскладывает fan_out_post, она же сдвигает версии.
+    """
+    if not created:
+        author_id = instance.author_id
+        transaction.on_commit(
+            lambda: tasks.refresh_follow_feeds.delay(author_id))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follower_feed(sender, instance, **kwargs):
+    bump_on_commit(follow_feed_scope(instance.user_id))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    old = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'group__slug').first()
+    instance._old_group_id, instance._old_group_slug = old or (None, None)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def bump_post_scopes(sender, instance, **kwargs):
+    """Пост меняет главную, страницы автора, группы (старой и новой)."""
+    bump_on_commit(*post_scopes(
+        instance.pk, instance.author.username,
+        getattr(instance, '_old_group_slug', None),
+        instance.group.slug if instance.group_id else None))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def bump_comment_post_scope(sender, instance, **kwargs):
+    bump_on_commit(post_scope(instance.post_id))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def bump_follow_author_scope(sender, instance, **kwargs):
+    # Число подписчиков и кнопка подписки на странице автора.
+    bump_on_commit(author_scope(instance.author.username))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._old_slug = Group.objects.filter(
+        pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def bump_group_scopes(sender, instance, **kwargs):
+    """Название группы видно на её странице, на главной и в постах."""
+    scopes = {GLOBAL_SCOPE, GROUPS_SCOPE, group_scope(instance.slug)}
+    if getattr(instance, '_old_slug', None):
+        scopes.add(group_scope(instance._old_slug))
+    post_ids = getattr(instance, '_post_ids', None)
+    if post_ids is None:
+        post_ids = instance.posts.values_list('id', flat=True)
+    scopes.update(post_scope(post_id) for post_id in post_ids)
+    bump_on_commit(*scopes)
+
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login: лишний запрос не нужен.
+    instance._old_names = None
+    if update_fields is not None and not set(update_fields) & set(
+            USER_NAME_FIELDS):
+        return
+    instance._old_names = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def refresh_author_names(sender, instance, created, **kwargs):
+    """Имя автора видно в его постах во всех лентах и на его странице."""
+    old = getattr(instance, '_old_names', None)
+    if created or old is None:
+        return
+    if old == tuple(getattr(instance, name) for name in USER_NAME_FIELDS):
+        return
+    user_id, old_username = instance.pk, old[0]
+    transaction.on_commit(
+        lambda: tasks.refresh_author.delay(user_id, old_username))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.fan_out_post.delay(instance.pk, key=f'fan_out:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        tasks.backfill_timeline.delay(
+            instance.user_id, instance.author_id,
+            key=f'backfill:{instance.pk}')
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def count_group_post(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        stats.change_group(instance.group_id, 1, instance.pub_date)
+    elif old_group_id != instance.group_id:
+        stats.change_group(old_group_id, -1)
+        stats.change_group(instance.group_id, 1, instance.pub_date)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_group_post(sender, instance, **kwargs):
+    stats.change_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Group)
+def create_group_stats(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+def _change_followers(author_id, delta):
+    before, after = stats.change_followers(author_id, delta)
+    if timeline.crosses_threshold(before, after):
+        tasks.rebalance_timelines.delay(author_id)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        _change_followers(instance.author_id, 1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    _change_followers(instance.author_id, -1)
+    stats.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove([instance.id])
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().index(instance.posts.select_related('group'))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(instance.posts.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reindex_orphaned_posts(sender, instance, **kwargs):
+    # После SET_NULL у постов нет группы, а в индексе осталось её название.
+    get_backend().index(Post.objects.filter(
+        id__in=getattr(instance, '_post_ids', [])))
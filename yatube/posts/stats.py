@@ -0,0 +1,179 @@
+"""
+Денормализованные счётчики: посты, подписчики, подписки, комментарии,
+число постов и время последней записи в группе.
+"""
+from django.db import transaction
+from django.db.models import (Case, Count, DateTimeField, F, OuterRef,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (AuthorStats, Comment, Follow, Group, GroupStats, Post,
+                     User)
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по field = OuterRef('pk') (0, если строк нет)."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')[:1]
+    ), 0)
+
+
+def author_counts(users=None):
+    users = User.objects.all() if users is None else users
+    return users.annotate(
+        posts_total=_count(Post.objects.all(), 'author'),
+        followers_total=_count(Follow.objects.all(), 'author'),
+        following_total=_count(Follow.objects.all(), 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+
+
+def _shifted(field, delta):
+    # Поля PositiveIntegerField: уход ниже нуля (двойное удаление,
+    # рассинхрон) — IntegrityError, поэтому счётчик останавливается на 0.
+    return Greatest(F(field) + delta, 0)
+
+
+def _author_totals(user_id):
+    _, posts, followers, following = author_counts(
+        User.objects.filter(pk=user_id)).get()
+    return {
+        'posts_count': posts,
+        'followers_count': followers,
+        'following_count': following,
+    }
+
+
+def recount(user_id):
+    """Пересчитывает счётчики одного автора с нуля."""
+    stats, _ = AuthorStats.objects.update_or_create(
+        user_id=user_id, defaults=_author_totals(user_id))
+    return stats
+
+
+def change(user_id, **deltas):
+    """Атомарно сдвигает счётчики автора через F()-выражения."""
+    shifts = {field: _shifted(field, delta) for field, delta in deltas.items()}
+    rows = AuthorStats.objects.filter(user_id=user_id)
+    if rows.update(**shifts) or not User.objects.filter(pk=user_id).exists():
+        return
+    # Строки ещё нет: её создаёт пересчёт, где текущая запись уже учтена.
+    # Если строку успел создать параллельный вызов, сдвиг идёт в неё.
+    _, created = AuthorStats.objects.get_or_create(
+        user_id=user_id, defaults=_author_totals(user_id))
+    if not created:
+        rows.update(**shifts)
+
+
+def change_followers(author_id, delta):
+    """
+    Сдвигает число подписчиков автора; возвращает значения до и после.
+    Чтение идёт в той же транзакции: строку держит наш UPDATE.
+    """
+    with transaction.atomic():
+        change(author_id, followers_count=delta)
+        after = AuthorStats.objects.filter(user_id=author_id).values_list(
+            'followers_count', flat=True).first() or 0
+    return after - delta, after
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta))
+
+
+def _last_post(field):
+    """Подзапрос: дата последнего поста группы OuterRef(field)."""
+    return Subquery(Post.objects.filter(
+        group=OuterRef(field)).order_by('-pub_date').values('pub_date')[:1])
+
+
+def group_counts(groups=None):
+    groups = Group.objects.all() if groups is None else groups
+    return groups.annotate(
+        posts_total=_count(Post.objects.all(), 'group'),
+        last_post=_last_post('pk'),
+    ).values_list('pk', 'posts_total', 'last_post')
+
+
+def recount_groups(groups=None):
+    """Пересчитывает счётчики групп с нуля (все или выбранные)."""
+    rows = [GroupStats(group_id=group_id, posts_count=posts,
+                       last_post_at=last_post)
+            for group_id, posts, last_post in group_counts(groups)]
+    with transaction.atomic():
+        GroupStats.objects.filter(
+            group_id__in=[row.group_id for row in rows]).delete()
+        GroupStats.objects.bulk_create(rows)
+    return len(rows)
+
+
+def change_group(group_id, delta, pub_date=None):
+    """
+    Сдвигает счётчик постов группы. Новый пост сдвигает и время
+    последней записи, а после удаления оно берётся по индексу заново.
+    """
+    if group_id is None:
+        return
+    if delta > 0 and pub_date is not None:
+        last_post_at = Case(
+            When(last_post_at__gte=pub_date, then=F('last_post_at')),
+            default=Value(pub_date), output_field=DateTimeField())
+    else:
+        last_post_at = _last_post('group_id')
+    updated = GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=_shifted('posts_count', delta),
+        last_post_at=last_post_at)
+    if not updated:
+        recount_groups(Group.objects.filter(pk=group_id))
+
+
+def stats_for(user):
+    """Счётчики автора; если строки нет, она создаётся пересчётом."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return recount(user.pk)
+
+
+def recount_all(batch_size=1000):
+    """Чинит расхождения счётчиков для всех авторов, постов и групп."""
+    users = _recount_authors(author_counts(), batch_size)
+    posts = Post.objects.update(
+        comments_count=_count(Comment.objects.all(), 'post'))
+    recount_groups()
+    return users, posts
+
+
+def recount_many(user_ids, post_ids=(), batch_size=1000):
+    """Пересчёт счётчиков выбранных авторов и постов после bulk_create."""
+    user_ids = list(user_ids)
+    post_ids = list(post_ids)
+    for start in range(0, len(user_ids), batch_size):
+        _recount_authors(author_counts(User.objects.filter(
+            pk__in=user_ids[start:start + batch_size])), batch_size)
+    for start in range(0, len(post_ids), batch_size):
+        Post.objects.filter(pk__in=post_ids[start:start + batch_size]).update(
+            comments_count=_count(Comment.objects.all(), 'post'))
+
+
+def _recount_authors(counts, batch_size):
+    users = 0
+    rows = []
+    for user_id, posts, followers, following in counts.iterator():
+        rows.append(AuthorStats(user_id=user_id, posts_count=posts,
+                                followers_count=followers,
+                                following_count=following))
+        if len(rows) >= batch_size:
+            users += _save_stats(rows)
+            rows = []
+    users += _save_stats(rows)
+    return users
+
+
+def _save_stats(rows):
+    user_ids = [row.user_id for row in rows]
+    with transaction.atomic():
+        AuthorStats.objects.filter(user_id__in=user_ids).delete()
+        AuthorStats.objects.bulk_create(rows)
+    return len(rows)
@@ -0,0 +1,95 @@
+"""
+Фоновые задачи постов (jobs): то, что не нужно ждать в запросе.
+
+Задача может выполниться позже записи и даже после её удаления,
+поэтому каждая сама проверяет, что объекты ещё на месте.
+"""
+from django.conf import settings
+
+from jobs.queue import task
+
+from . import groups, thumbnails, timeline
+from .cache import (GLOBAL_SCOPE, GROUPS_SCOPE, author_scope, bump_version,
+                    follow_feed_scope, group_scope, post_scope)
+from .models import Comment, Follow, Post, User
+
+
+def _bump_follower_feeds(author_id):
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    bump_version(*(follow_feed_scope(user_id) for user_id in followers))
+
+
+@task
+def build_thumbnail(name):
+    """Миниатюра для ленты; фрагменты с исходной картинкой устаревают."""
+    thumbnails.build(name)
+    thumbnails.refresh_posts(name)
+
+
+@task
+def fan_out_post(post_id):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).only(
+        'id', 'author_id', 'pub_date').first()
+    if post is None:
+        return
+    timeline.fan_out(post)
+    _bump_follower_feeds(post.author_id)
+
+
+@task
+def refresh_follow_feeds(author_id):
+    """Правка или удаление поста меняет ленты подписчиков автора."""
+    _bump_follower_feeds(author_id)
+
+
+@task
+def backfill_timeline(user_id, author_id):
+    """Последние посты автора в ленту нового подписчика."""
+    # Отписка могла случиться раньше, чем дошла очередь до задачи.
+    if not Follow.objects.filter(user_id=user_id,
+                                 author_id=author_id).exists():
+        return
+    timeline.backfill(user_id, author_id)
+    bump_version(follow_feed_scope(user_id))
+
+
+@task
+def rebalance_timelines(author_id):
+    """Автор пересёк порог TIMELINE_CELEBRITY_FOLLOWERS."""
+    timeline.rebalance(author_id)
+    _bump_follower_feeds(author_id)
+
+
+@task
+def refresh_author(user_id, old_username):
+    """
+    Автор сменил имя: оно во фрагментах его постов, в комментариях и
+    в лентах подписчиков.
+    """
+    username = User.objects.filter(pk=user_id).values_list(
+        'username', flat=True).first()
+    if username is None:
+        return
+    posts = Post.objects.filter(author_id=user_id)
+    group_slugs = set(posts.exclude(group=None).values_list(
+        'group__slug', flat=True))
+    post_ids = set(posts.values_list('id', flat=True))
+    post_ids.update(Comment.objects.filter(author_id=user_id).values_list(
+        'post_id', flat=True))
+    followers = Follow.objects.filter(
+        author_id=user_id).values_list('user_id', flat=True)
+    bump_version(
+        GLOBAL_SCOPE, GROUPS_SCOPE,
+        author_scope(username), author_scope(old_username),
+        *(group_scope(slug) for slug in group_slugs),
+        *(post_scope(post_id) for post_id in post_ids),
+        *(follow_feed_scope(user_id) for user_id in followers),
+    )
+
+
+@task(every=settings.TRENDING_INTERVAL)
+def refresh_trending():
+    """Пересчёт рейтинга групп (TrendingGroup)."""
+    groups.refresh_trending()
@@ -0,0 +1,49 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.conditional import mark_stale
+from posts.recompute import cached
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, timeout, name, version, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.version = version
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on])
+        request = context.get('request')
+        on_stale = (lambda: mark_stale(request)) if request else None
+        return cached(key, lambda: self.nodelist.render(context), timeout,
+                      self.version.resolve(context), name=self.name,
+                      strict_version=True, on_stale=on_stale)
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    {% fragment срок имя версия [ключ ...] %} ... {% endfragment %}
+
+    Как {% cache %}, но версия не входит в ключ: при её смене один
+    запрос перерисовывает фрагмент, а остальные получают прежний
+    (posts.recompute). Страница с ним уходит без ETag и с no-store:
+    ETag уже построен по новой версии, и 304 на него закрепил бы
+    у клиента старое тело.
+    """
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает срок, имя, версию и ключи")
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]])
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.thumbnails import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_thumbnail(image):
+    """Миниатюра для ленты, если она уже построена, иначе None."""
+    return ready_thumbnail(image)
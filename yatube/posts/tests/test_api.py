@@ -0,0 +1,211 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.test_thumbnails import SMALL_GIF
+from posts.tests.utils import run_on_commit
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='apiAuthor')
+        cls.reader = User.objects.create_user(username='apiReader')
+        cls.group = Group.objects.create(
+            title='API', slug='api', description='Описание')
+        for number in range(12):
+            Post.objects.create(author=cls.author, text=f'Пост {number}',
+                                group=cls.group if number % 2 else None)
+        cls.post = Post.objects.create(author=cls.author, text='Свежий пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json')
+
+    def test_feed_cursor_pagination(self):
+        """Лента отдаётся курсорными страницами с выбранными полями"""
+        url = reverse('api:posts')
+        first = self.guest_client.get(url, {'limit': 5}).json()
+        self.assertEqual(len(first['results']), 5)
+        self.assertEqual(first['results'][0]['text'], 'Свежий пост')
+        self.assertEqual(set(first['results'][0]), {
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'comments_count'})
+        second = self.guest_client.get(
+            url, {'limit': 5, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second['results'][0]['text'], 'Пост 7')
+        self.assertIsNotNone(second['previous_cursor'])
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304"""
+        url = reverse('api:group_posts', args=[self.group.slug])
+        response = self.guest_client.get(url)
+        self.assertEqual(len(response.json()['results']), 6)
+        etag = response['ETag']
+        self.assertEqual(self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый',
+                                group=self.group)
+        self.assertEqual(self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etags_follow_scope_versions(self):
+        """ETag списков меняется от отписки, правки и комментария"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        feed_url = reverse('api:follow_feed')
+        list_url = reverse('api:posts')
+
+        def unchanged(url):
+            etag = self.reader_client.get(url)['ETag']
+            return lambda: self.reader_client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        feed = unchanged(feed_url)
+        self.assertTrue(feed())
+        with run_on_commit():
+            Follow.objects.filter(user=self.reader).delete()
+        self.assertFalse(feed())
+
+        posts = unchanged(list_url)
+        with run_on_commit():
+            Post.objects.filter(pk=self.post.pk).first().save()
+        self.assertFalse(posts())
+        posts = unchanged(list_url)
+        with run_on_commit():
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text='Счётчик')
+        self.assertFalse(posts())
+
+    def test_csrf_failure_is_json(self):
+        """Запись без csrf-токена получает 403 в JSON, а не HTML"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        response = self.send(client, 'post', reverse('api:posts'),
+                             {'text': 'Без токена'})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['detail'])
+
+    def test_list_etag_follows_comments_of_listed_posts(self):
+        """Комментарий меняет ETag только тех списков, где виден пост"""
+        url = reverse('api:posts')
+        response = self.guest_client.get(url, {'limit': 1})
+        etag = response['ETag']
+        listed = response.json()['results'][0]['id']
+
+        def revalidate():
+            return self.guest_client.get(
+                url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag).status_code
+
+        with self.assertNumQueries(0):
+            self.assertEqual(revalidate(), 304)
+        with run_on_commit():
+            Comment.objects.create(post=Post.objects.exclude(
+                pk=listed).first(), author=self.reader, text='Мимо')
+        self.assertEqual(revalidate(), 304)
+        with run_on_commit():
+            Comment.objects.create(post_id=listed, author=self.reader,
+                                   text='В списке')
+        self.assertEqual(revalidate(), 200)
+
+    def test_post_detail_etag_follows_edits(self):
+        """ETag поста меняется после правки через API"""
+        url = reverse('api:post_detail', args=[self.post.id])
+        etag = self.guest_client.get(url)['ETag']
+        response = self.send(self.reader_client, 'patch', url,
+                             {'text': 'Чужая правка'})
+        self.assertEqual(response.status_code, 403)
+        response = self.send(self.author_client, 'patch', url,
+                             {'text': 'Правка'})
+        self.assertEqual(response.json()['text'], 'Правка')
+        self.assertEqual(self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR),
+                       THUMBNAIL_ASYNC=False)
+    def test_patch_accepts_multipart(self):
+        """PATCH в multipart/form-data меняет текст и картинку"""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        url = reverse('api:post_detail', args=[self.post.id])
+        image = SimpleUploadedFile('patch.gif', SMALL_GIF, 'image/gif')
+        response = self.author_client.patch(
+            url, encode_multipart(BOUNDARY, {'text': 'С картинкой',
+                                             'image': image}),
+            content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'С картинкой')
+        self.assertTrue(self.post.image.name.startswith('posts/patch'))
+
+    def test_create_post_uses_form_validation(self):
+        """Создание поста проходит валидацию PostForm"""
+        url = reverse('api:posts')
+        self.assertEqual(
+            self.send(self.guest_client, 'post', url, {'text': 'x'})
+            .status_code, 401)
+        response = self.send(self.reader_client, 'post', url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+        response = self.send(self.reader_client, 'post', url,
+                             {'text': 'Из API', 'group': self.group.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['group'], 'api')
+        self.assertTrue(Post.objects.filter(
+            author=self.reader, text='Из API').exists())
+
+    def test_comments(self):
+        """Комментарии добавляются и читаются по порядку"""
+        url = reverse('api:comments', args=[self.post.id])
+        for text in ('Первый', 'Второй'):
+            response = self.send(self.reader_client, 'post', url,
+                                 {'text': text})
+            self.assertEqual(response.status_code, 201)
+        results = self.guest_client.get(url).json()['results']
+        self.assertEqual([comment['text'] for comment in results],
+                         ['Первый', 'Второй'])
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 2)
+
+    def test_follow_and_follow_feed(self):
+        """Подписка через API и лента подписок"""
+        follow_url = reverse('api:follow', args=[self.author.username])
+        feed_url = reverse('api:follow_feed')
+        self.assertEqual(self.guest_client.get(feed_url).status_code, 401)
+        self.assertEqual(self.reader_client.post(follow_url).status_code, 201)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        feed = self.reader_client.get(feed_url).json()
+        self.assertEqual(feed['results'][0]['text'], 'Свежий пост')
+        profile = self.reader_client.get(
+            reverse('api:profile', args=[self.author.username])).json()
+        self.assertEqual((profile['following'], profile['followers_count']),
+                         (True, 1))
+        self.assertEqual(
+            self.reader_client.delete(follow_url).status_code, 204)
+        self.assertFalse(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+
+    def test_errors_are_json(self):
+        """Ошибки приходят в JSON"""
+        response = self.guest_client.get(
+            reverse('api:profile_posts', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        response = self.guest_client.delete(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from core import metrics, routers
+from core.asgi import WsgiToAsgi, build_environ
+from core.concurrent import gather
+
+
+def echo_app(environ, start_response):
+    """WSGI-приложение, которое возвращает тело запроса по частям."""
+    body = environ['wsgi.input'].read()
+    start_response('201 Created', [('Content-Type', 'text/plain'),
+                                   ('X-Path', environ['PATH_INFO'])])
+    return iter([b'', body[:3], body[3:]])
+
+
+def call(app, scope, chunks):
+    sent = []
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True}
+                for chunk in chunks]
+    messages.append({'type': 'http.request', 'body': b'',
+                     'more_body': False})
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def http_scope(path='/', query=b'', headers=()):
+    return {'type': 'http', 'method': 'POST', 'path': path,
+            'query_string': query, 'headers': list(headers),
+            'client': ('10.0.0.1', 5000), 'server': ('localhost', 8000)}
+
+
+class AsgiAdapterTests(SimpleTestCase):
+    def setUp(self):
+        self.app = WsgiToAsgi(echo_app, threads=2)
+        self.addCleanup(self.app.executor.shutdown)
+
+    def test_request_and_response_are_passed_through(self):
+        """Тело запроса доходит до WSGI, ответ уходит частями"""
+        sent = call(self.app, http_scope('/группа/'), [b'hel', b'lo!'])
+        start, *body = sent
+        self.assertEqual(start['status'], 201)
+        self.assertIn((b'x-path', '/группа/'.encode()), start['headers'])
+        self.assertEqual(b''.join(message['body'] for message in body),
+                         b'hello!')
+        self.assertFalse(body[-1].get('more_body', False))
+
+    def test_environ_follows_wsgi(self):
+        """Заголовки и адреса переносятся в environ по PEP 3333"""
+        environ = build_environ(http_scope(
+            query=b'page=2', headers=[
+                (b'content-type', b'text/plain'), (b'accept', b'a'),
+                (b'accept', b'b')]), None)
+        self.assertEqual(environ['QUERY_STRING'], 'page=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'a,b')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['SERVER_PORT'], '8000')
+
+    def test_lifespan(self):
+        """Сервер получает подтверждение запуска и остановки"""
+        sent = []
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+
+class GatherTests(SimpleTestCase):
+    def tearDown(self):
+        routers.reset()
+
+    @override_settings(VIEW_CONCURRENT_LOOKUPS=True)
+    def test_lookups_run_in_threads_with_pin(self):
+        """Запросы идут в пуле, привязка к основной базе переносится"""
+        routers.pin_to_primary()
+        main = threading.current_thread()
+        results = gather(lambda: 1, threading.current_thread,
+                         routers.is_pinned)
+        self.assertEqual(results[0], 1)
+        self.assertIsNot(results[1], main)
+        self.assertTrue(results[2])
+
+    @override_settings(VIEW_CONCURRENT_LOOKUPS=True)
+    def test_lookups_carry_metrics(self):
+        """Потоки пула считают запросы в метрики своего запроса"""
+        stats = metrics.RequestStats()
+        with metrics.measuring(stats):
+            results = gather(lambda: 1, metrics.active_stats)
+        self.assertEqual(results, [1, (stats,)])
+        self.assertEqual(gather(lambda: 1, metrics.active_stats), [1, ()])
+
+    @override_settings(VIEW_CONCURRENT_LOOKUPS=False)
+    def test_lookups_run_in_order_when_disabled(self):
+        """Без VIEW_CONCURRENT_LOOKUPS всё выполняет поток запроса"""
+        self.assertEqual(gather(threading.current_thread),
+                         [threading.current_thread()])
+        self.assertEqual(gather(lambda: 1, threading.current_thread),
+                         [1, threading.current_thread()])
+
+    @override_settings(VIEW_CONCURRENT_LOOKUPS=True)
+    def test_error_is_raised(self):
+        """Ошибка любой функции выходит из gather"""
+        def fail():
+            raise LookupError
+
+        with self.assertRaises(LookupError):
+            gather(lambda: 1, fail)
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.benchmark import compare, percentile
+from posts.models import AuthorStats, Follow, Post, User
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed_benchmark', users=20, groups=3, posts=150,
+                     follows=60, comments=30, batch_size=40,
+                     stdout=StringIO())
+
+    def run_benchmark(self, **options):
+        call_command('run_benchmark', iterations=3, warmup=1,
+                     stdout=StringIO(), **options)
+
+    def test_seed_creates_dataset(self):
+        """seed_benchmark создаёт данные и пересчитывает счётчики"""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 150)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            150)
+
+    def test_report_and_baseline(self):
+        """Отчёт пишется в JSON, рост числа запросов считается регрессией"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            self.run_benchmark(output=output)
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+            self.assertEqual(report['dataset']['posts'], 150)
+            self.assertIn('follow_index', report['results'])
+            for result in report['results'].values():
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.run_benchmark(baseline=output, tolerance=100)
+
+            report['results']['index']['queries'] = 0
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(report, file)
+            with self.assertRaises(CommandError):
+                self.run_benchmark(baseline=output, tolerance=100,
+                                   only=['index'])
+
+    def test_compare_latency_tolerance(self):
+        """Латентность сравнивается с допуском"""
+        baseline = {'results': {'index': {'queries': 1, 'p95_ms': 10.0}}}
+        report = {'results': {'index': {'queries': 1, 'p95_ms': 12.0}}}
+        self.assertEqual(compare(report, baseline, tolerance=0.25), [])
+        report['results']['index']['p95_ms'] = 20.0
+        self.assertEqual(len(compare(report, baseline, tolerance=0.25)), 1)
+        self.assertEqual(percentile([3, 1, 2, 4], 50), 2)
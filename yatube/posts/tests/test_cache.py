@@ -0,0 +1,179 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from jobs.models import Job
+from posts.cache import author_scope, get_version, post_scope
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import run_on_commit
+
+
+class FollowFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.first_author = User.objects.create_user(username='firstAuthor')
+        cls.second_author = User.objects.create_user(username='secondAuthor')
+        cls.first_reader = User.objects.create_user(username='firstReader')
+        cls.second_reader = User.objects.create_user(username='secondReader')
+        Post.objects.create(author=cls.first_author, text='Пост первого')
+        Post.objects.create(author=cls.second_author, text='Пост второго')
+        Follow.objects.create(user=cls.first_reader, author=cls.first_author)
+        Follow.objects.create(user=cls.second_reader,
+                              author=cls.second_author)
+
+    def setUp(self):
+        cache.clear()
+        self.first_client = Client()
+        self.first_client.force_login(self.first_reader)
+        self.second_client = Client()
+        self.second_client.force_login(self.second_reader)
+        self.url = reverse('posts:follow_index')
+
+    def test_feed_is_cached_per_user(self):
+        """Каждый пользователь видит свою ленту, а не чужую из кеша"""
+        first = self.first_client.get(self.url)
+        second = self.second_client.get(self.url)
+        self.assertContains(first, 'Пост первого')
+        self.assertNotContains(first, 'Пост второго')
+        self.assertContains(second, 'Пост второго')
+        self.assertNotContains(second, 'Пост первого')
+
+    def test_new_post_invalidates_followers_feed(self):
+        """Новый пост сразу виден подписчикам без очистки кеша"""
+        self.first_client.get(self.url)
+        with run_on_commit():
+            Post.objects.create(author=self.first_author, text='Свежий пост')
+        response = self.first_client.get(self.url)
+        self.assertContains(response, 'Свежий пост')
+
+    @override_settings(TASKS_SYNC=False)
+    def test_followers_feeds_are_bumped_by_jobs(self):
+        """Ленты подписчиков сдвигает очередь: fan_out или своя задача"""
+        with run_on_commit():
+            post = Post.objects.create(author=self.first_author,
+                                       text='Через очередь')
+            post.text = 'Исправлен'
+            post.save()
+        names = list(Job.objects.values_list('name', flat=True))
+        self.assertEqual(names.count('posts.tasks.fan_out_post'), 1)
+        self.assertEqual(names.count('posts.tasks.refresh_follow_feeds'), 1)
+
+    def test_post_delete_invalidates_followers_feed(self):
+        """Удалённый пост сразу пропадает из ленты"""
+        post = Post.objects.create(author=self.first_author,
+                                   text='Удаляемый пост')
+        self.assertContains(self.first_client.get(self.url),
+                            'Удаляемый пост')
+        with run_on_commit():
+            post.delete()
+        self.assertNotContains(self.first_client.get(self.url),
+                               'Удаляемый пост')
+
+    def test_follow_and_unfollow_invalidate_feed(self):
+        """Подписка и отписка сбрасывают кеш ленты"""
+        self.assertNotContains(self.first_client.get(self.url),
+                               'Пост второго')
+        with run_on_commit():
+            self.first_client.get(reverse(
+                'posts:profile_follow', args=[self.second_author.username]))
+        self.assertContains(self.first_client.get(self.url), 'Пост второго')
+        with run_on_commit():
+            self.first_client.get(reverse(
+                'posts:profile_unfollow', args=[self.second_author.username]))
+        self.assertNotContains(self.first_client.get(self.url),
+                               'Пост второго')
+
+
+class VersionedFragmentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='fragmentAuthor')
+        cls.group = Group.objects.create(title='Старое название',
+                                         slug='fragments', description='')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Исходный текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_pages_show_new_post_without_clearing_cache(self):
+        """Новый пост сразу виден на закешированных лентах"""
+        urls = (reverse('posts:index'),
+                reverse('posts:group_posts', args=[self.group.slug]),
+                reverse('posts:profile', args=[self.author.username]))
+        for url in urls:
+            self.client.get(url)
+        with run_on_commit():
+            Post.objects.create(author=self.author, group=self.group,
+                                text='Свежая запись')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежая запись')
+
+    def test_post_edit_and_comment_refresh_detail(self):
+        """Правка поста и новый комментарий обновляют его страницу"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        self.client.get(url)
+        with run_on_commit():
+            self.post.text = 'Исправленный текст'
+            self.post.save()
+            Comment.objects.create(post=self.post, author=self.author,
+                                   text='Первый комментарий')
+        response = self.client.get(url)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertContains(response, 'Первый комментарий')
+
+    def test_group_rename_refreshes_post_detail(self):
+        """Новое название группы видно на закешированной странице поста"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        self.client.get(url)
+        with run_on_commit():
+            self.group.title = 'Новое название'
+            self.group.save()
+        self.assertContains(self.client.get(url), 'Новое название')
+
+    def test_versions_move_after_commit(self):
+        """Версия сдвигается только после фиксации транзакции"""
+        before = get_version(post_scope(self.post.id))
+        with run_on_commit():
+            self.post.save()
+            self.assertEqual(get_version(post_scope(self.post.id)), before)
+        self.assertNotEqual(get_version(post_scope(self.post.id)), before)
+
+    def test_author_rename_refreshes_fragments(self):
+        """Новое имя автора видно в закешированных лентах"""
+        urls = (reverse('posts:index'),
+                reverse('posts:group_posts', args=[self.group.slug]),
+                reverse('posts:post_detail', args=[self.post.id]))
+        for url in urls:
+            self.client.get(url)
+        with run_on_commit():
+            self.author.first_name = 'Переименованный'
+            self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Переименованный')
+
+    def test_login_does_not_refresh_fragments(self):
+        """Сохранение last_login не трогает версии"""
+        before = get_version(author_scope(self.author.username))
+        with run_on_commit():
+            self.author.save(update_fields=['last_login'])
+        self.assertEqual(get_version(author_scope(self.author.username)),
+                         before)
+
+    def test_unchanged_page_reuses_fragment(self):
+        """Без записей фрагмент ленты берётся из кеша, а не из базы"""
+        url = reverse('posts:group_posts', args=[self.group.slug])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(url, {'page': 1})
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url, {'page': 1})
+        self.assertLess(len(warm), len(cold))
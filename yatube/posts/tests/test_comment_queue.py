@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import comment_queue
+from posts.comment_queue import SqliteQueue
+from posts.models import Comment, Post, User
+
+
+@override_settings(COMMENT_WRITE_BEHIND='memory', COMMENT_FLUSH_THREAD=False)
+class WriteBehindCommentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='liveAuthor')
+        cls.reader = User.objects.create_user(username='liveReader')
+        cls.post = Post.objects.create(author=cls.author, text='Трансляция')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(comment_queue.drain)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.detail_url = reverse('posts:post_detail', args=[self.post.id])
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': text})
+
+    def test_comment_is_queued_and_visible_to_its_author(self):
+        """Комментарий ждёт в очереди, но автор видит его сразу"""
+        self.comment('Гол!')
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(self.detail_url), 'Гол!')
+        guest = Client()
+        self.assertNotContains(guest.get(self.detail_url), 'Гол!')
+
+    def test_author_does_not_get_not_modified_after_commenting(self):
+        """Свой комментарий в очереди меняет ETag страницы"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.comment('Гол!')
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_flush_writes_batch_and_clears_overlay(self):
+        """Пачка пишется одним bulk_create, счётчики и страница обновляются"""
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        with self.assertNumQueries(6):
+            self.assertEqual(comment_queue.flush(), 3)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual(comment_queue.pending_for(self.post.id, self.reader),
+                         [])
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'Комментарий 1', count=1)
+        self.assertContains(Client().get(self.detail_url), 'Комментарий 1')
+
+    @override_settings(COMMENT_BATCH_SIZE=2)
+    def test_flush_is_bounded_by_batch_size(self):
+        """За раз пишется не больше COMMENT_BATCH_SIZE комментариев"""
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        self.assertEqual(comment_queue.flush(), 2)
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(comment_queue.flush(), 0)
+
+    def test_comments_of_deleted_post_are_dropped(self):
+        """Комментарии к посту, удалённому до записи, отбрасываются"""
+        post = Post.objects.create(author=self.author, text='Удалят')
+        comment_queue.enqueue(post.id, self.reader, 'Опоздал')
+        post.delete()
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertFalse(Comment.objects.filter(text='Опоздал').exists())
+
+    def test_comments_of_deleted_author_are_dropped(self):
+        """Комментарии удалённого автора не держат пачку"""
+        gone = User.objects.create_user(username='goneReader')
+        comment_queue.enqueue(self.post.id, gone, 'Ушёл')
+        comment_queue.enqueue(self.post.id, self.reader, 'Остался')
+        gone.delete()
+        self.assertEqual(comment_queue.flush(), 2)
+        self.assertEqual(list(Comment.objects.values_list('text', flat=True)),
+                         ['Остался'])
+
+    @override_settings(COMMENT_MAX_ATTEMPTS=2)
+    def test_broken_comment_is_isolated_and_dropped(self):
+        """Негодная запись не мешает пачке и уходит после попыток"""
+        queue = comment_queue.get_queue()
+        comment_queue.enqueue(self.post.id, self.reader, 'Хороший')
+        queue.put({'token': 'broken', 'post': self.post.id,
+                   'author': self.reader.id, 'text': None})
+        with self.assertLogs('posts.comment_queue', 'ERROR'):
+            self.assertEqual(comment_queue.flush(), 2)
+        self.assertTrue(Comment.objects.filter(text='Хороший').exists())
+        self.assertEqual(len(queue), 1)
+        with self.assertLogs('posts.comment_queue', 'ERROR'):
+            with self.assertRaises(IntegrityError):
+                comment_queue.flush()
+        self.assertEqual(len(queue), 0)
+
+    def test_invalid_comment_is_not_queued(self):
+        """Пустой комментарий не проходит форму и не попадает в очередь"""
+        self.comment('')
+        self.assertEqual(len(comment_queue.get_queue()), 0)
+
+
+class SqliteQueueTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'comments.sqlite3')
+
+    def test_queue_is_shared_and_acknowledged(self):
+        """Очередь в файле видна другим процессам; взятое не выдаётся дважды"""
+        SqliteQueue(self.path).put({'text': 'первый'})
+        SqliteQueue(self.path).put({'text': 'второй'})
+        queue = SqliteQueue(self.path)
+        taken = queue.take(1)
+        self.assertEqual([item for _, item in taken], [{'text': 'первый'}])
+        self.assertEqual([item for _, item in SqliteQueue(self.path).take(5)],
+                         [{'text': 'второй'}])
+        queue.ack(taken)
+        self.assertEqual(len(queue), 1)
+
+    def test_buried_items_leave_the_queue(self):
+        """Отложенные записи уходят из очереди в таблицу dead"""
+        queue = SqliteQueue(self.path)
+        queue.put({'text': 'негодный'})
+        queue.bury(queue.take(5))
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue._db.execute(
+            'SELECT COUNT(*) FROM dead').fetchone()[0], 1)
+
+    def test_released_batch_is_taken_again(self):
+        """Пачка, которую не удалось записать, возвращается в очередь"""
+        queue = SqliteQueue(self.path)
+        queue.put({'text': 'первый'})
+        queue.release(queue.take(5))
+        self.assertEqual(len(queue.take(5)), 1)
@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.paginator import NUM_OF_COMMENTS
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='viralAuthor')
+        cls.post = Post.objects.create(author=cls.author, text='Вирусный пост')
+        User.objects.bulk_create(
+            User(username=f'reader{number}') for number in range(30))
+        readers = User.objects.filter(username__startswith='reader')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=reader, text=f'Комментарий {number}')
+            for number, reader in enumerate(readers.order_by('id')))
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.id])
+        cls.more_url = reverse('posts:post_comments', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_detail_shows_first_page_of_comments(self):
+        """Пост показывает первую страницу комментариев и кнопку «Ещё»"""
+        response = self.client.get(self.detail_url)
+        comments = list(response.context['comments'])
+        self.assertEqual(len(comments), NUM_OF_COMMENTS)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'Показать ещё')
+        self.assertNotContains(response, f'Комментарий {NUM_OF_COMMENTS}\n')
+
+    def test_authors_are_loaded_in_one_query(self):
+        """Число запросов не зависит от числа авторов комментариев"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.detail_url)
+        comment_queries = [query for query in queries.captured_queries
+                           if 'posts_comment' in query['sql']]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertLess(len(queries), 15)
+
+    def test_fragment_endpoint_returns_next_batch(self):
+        """Кнопка «Ещё» получает следующую пачку без макета страницы"""
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(self.more_url,
+                                   {'cursor': first.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'Комментарий 29')
+        self.assertNotContains(response, 'Комментарий 0\n')
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_detail_and_endpoint_share_fragment(self):
+        """Страница поста и «Ещё» читают один и тот же фрагмент"""
+        first = self.client.get(self.detail_url).context['comments']
+        self.client.get(self.more_url, {'cursor': first.next_cursor})
+        cursor = f'?comments={first.next_cursor}'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url + cursor)
+        self.assertContains(response, 'Комментарий 29')
+        self.assertFalse(any('posts_comment' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_detail_pages_comments_without_javascript(self):
+        """?comments= открывает следующую страницу комментариев"""
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(self.detail_url,
+                                   {'comments': first.next_cursor})
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {number}' for number in range(20, 30)])
+
+    def test_fragment_endpoint_for_missing_post(self):
+        """Комментарии несуществующего поста — 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id + 100]))
+        self.assertEqual(response.status_code, 404)
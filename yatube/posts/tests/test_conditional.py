@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import run_on_commit
+
+
+class ConditionalPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etagAuthor')
+        cls.reader = User.objects.create_user(username='etagReader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag-group', description='Описание')
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='etag-other', description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, url, client=None):
+        """Код ответа на повторный запрос с ETag первого ответа."""
+        client = client or self.guest_client
+        etag = client.get(url)['ETag']
+        return lambda: client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_not_modified_without_queries_and_templates(self):
+        """Неизменившаяся главная отдаёт 304 без базы и шаблонов"""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+
+    def test_new_post_changes_index_and_group_only(self):
+        """Новый пост меняет главную и свою группу, но не чужую"""
+        index = self.revalidate(reverse('posts:index'))
+        group = self.revalidate(
+            reverse('posts:group_posts', args=[self.group.slug]))
+        other = self.revalidate(
+            reverse('posts:group_posts', args=[self.other_group.slug]))
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый',
+                                group=self.group)
+        self.assertEqual((index(), group(), other()), (200, 200, 304))
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет страницу автора"""
+        url = reverse('posts:profile', args=[self.author.username])
+        profile = self.revalidate(url, self.reader_client)
+        self.assertEqual(profile(), 304)
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(profile(), 200)
+
+    def test_follow_feed_follows_its_scope(self):
+        """Лента подписок отдаёт 304, пока не пишут авторы из подписок"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:follow_index')
+        response = self.reader_client.get(url)
+        self.assertEqual(response.context['page_source'], 'primary')
+        feed = self.revalidate(url, self.reader_client)
+        self.assertEqual(feed(), 304)
+        with run_on_commit():
+            Post.objects.create(author=self.reader, text='Свой пост')
+        self.assertEqual(feed(), 304)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(feed(), 200)
+        self.assertContains(self.reader_client.get(url), 'Новый пост')
+
+    def test_comment_changes_post_detail(self):
+        """Комментарий меняет страницу поста"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        detail = self.revalidate(url)
+        with run_on_commit():
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text='Комментарий')
+        self.assertEqual(detail(), 200)
+
+    def test_stale_fragment_response_is_not_cached(self):
+        """Страница с фрагментом прежней версии уходит без ETag"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый')
+        # Фрагмент пересчитывает другой запрос.
+        with mock.patch('posts.recompute.cache.add', return_value=False):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Новый')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertContains(self.guest_client.get(url), 'Новый')
+
+    def test_relogin_changes_etag(self):
+        """После нового входа страница с формой приходит заново"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.reader_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.reader_client.logout()
+        self.reader_client.force_login(self.reader)
+        self.assertEqual(self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_pages_are_private_for_users(self):
+        """Страницы пользователя не кешируются прокси и у каждого свой ETag"""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.reader_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'],
+                            self.guest_client.get(url)['ETag'])
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_connection(self):
+        """Новое соединение получает PRAGMA из настроек"""
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 20000)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal',
+                                       'busy_timeout': 1234})
+    def test_file_database_uses_wal(self):
+        """Файловая база переходит в режим WAL"""
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = dict(connection.settings_dict,
+                                 NAME=os.path.join(directory, 'wal.db'))
+            wrapper = DatabaseWrapper(settings_dict, alias='wal_test')
+            try:
+                self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+                self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+            finally:
+                wrapper.close()
@@ -0,0 +1,77 @@
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ExportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='exportAuthor')
+        cls.reader = User.objects.create_user(username='exportReader')
+        cls.group = Group.objects.create(
+            title='Выгрузка', slug='export', description='Описание')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Старый пост', group=cls.group)
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=timezone.now() - datetime.timedelta(days=30))
+        cls.new_post = Post.objects.create(
+            author=cls.author, text='Новый пост')
+        cls.comment = Comment.objects.create(
+            post=cls.new_post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_content', stdout=out, **options)
+        return out.getvalue()
+
+    def test_ndjson(self):
+        """NDJSON: по записи на строку для каждого вида"""
+        records = [json.loads(line) for line in
+                   self.export(chunk_size=1).splitlines()]
+        self.assertEqual([record['type'] for record in records],
+                         ['post', 'post', 'comment', 'follow'])
+        self.assertEqual(records[0]['group'], 'export')
+        self.assertEqual(records[2]['post'], self.new_post.id)
+        self.assertEqual(records[3], {'type': 'follow',
+                                      'user': 'exportReader',
+                                      'author': 'exportAuthor'})
+
+    def test_since(self):
+        """--since выгружает только новые посты и комментарии"""
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        records = [json.loads(line) for line in self.export(
+            since=since, kinds=['posts', 'comments']).splitlines()]
+        self.assertEqual([record.get('text') for record in records],
+                         ['Новый пост', 'Комментарий'])
+
+    def test_csv(self):
+        """CSV с общим заголовком для всех видов"""
+        rows = list(csv.DictReader(StringIO(self.export(format='csv'))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1]['text'], 'Новый пост')
+
+    def test_endpoint_streams_for_staff_only(self):
+        """Эндпоинт выгрузки потоковый и доступен только персоналу"""
+        url = reverse('posts:export_content')
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='exportStaff',
+                                         is_staff=True)
+        client.force_login(staff)
+        response = client.get(url, {'format': 'csv', 'kinds': 'follows'})
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('exportReader', body)
+        self.assertEqual(
+            client.get(url, {'since': 'вчера'}).status_code, 400)
@@ -1,9 +1,12 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from io import BytesIO
+from PIL import Image
 import tempfile
 import shutil
+from unittest import mock
 
 from posts.forms import PostForm
 from posts.models import Group, Post, User
@@ -163,3 +166,125 @@ class TestCreateForm(TestCase):
         self.assertFalse(Post.objects.filter(
             text='Обновленный текст',
             group=TestCreateForm.group).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR),
+                   THUMBNAIL_ASYNC=False)
+class TestImageUploadLimits(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @staticmethod
+    def get_image(name, image_format, size=(50, 50), **save_options):
+        file_obj = BytesIO()
+        Image.new('RGB', size=size, color=(255, 0, 0)).save(
+            file_obj, image_format, **save_options)
+        file_obj.name = name
+        file_obj.seek(0)
+        return file_obj
+
+    def create_post(self, text, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': text, 'image': image},
+        )
+
+    @override_settings(UPLOAD_MAX_BYTES=100)
+    def test_oversized_upload_is_rejected(self):
+        """Файл больше лимита отклоняется с понятной ошибкой"""
+        response = self.create_post('Большой файл',
+                                    self.get_image('big.png', 'PNG'))
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+        self.assertIn('Файл слишком большой',
+                      str(response.context['form'].errors['image']))
+
+    @override_settings(UPLOAD_MAX_BYTES=100)
+    def test_oversized_upload_is_rejected_in_admin(self):
+        """Админка тоже отвечает ошибкой формы, а не 500"""
+        admin = User.objects.create_superuser(
+            username='uploadAdmin', email='admin@example.com',
+            password='pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.post(
+            reverse('admin:posts_post_add'),
+            data={'text': 'Большой файл', 'author': admin.pk,
+                  'image': self.get_image('big.png', 'PNG')})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+        self.assertIn('Файл слишком большой',
+                      str(response.context['adminform'].form.errors))
+
+    @override_settings(UPLOAD_MAX_PIXELS=100)
+    def test_too_many_pixels_is_rejected(self):
+        """Картинка с большим разрешением отклоняется по заголовку"""
+        response = self.create_post('Много пикселей',
+                                    self.get_image('wide.png', 'PNG'))
+        self.assertFalse(Post.objects.filter(text='Много пикселей').exists())
+        self.assertIn('Картинка слишком большая',
+                      str(response.context['form'].errors['image']))
+
+    def test_metadata_is_stripped(self):
+        """EXIF удаляется при перекодировании"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Secret Camera'
+        self.create_post('С метаданными',
+                         self.get_image('photo.jpg', 'JPEG',
+                                        exif=exif.tobytes()))
+        post = Post.objects.get(text='С метаданными')
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+
+    def test_mpo_is_saved_as_jpeg(self):
+        """Снимок MPO с телефона перекодируется в JPEG без EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Secret Phone'
+        open_image = Image.open
+
+        def open_as_mpo(*args, **kwargs):
+            # Pillow не умеет записывать MPO: JPEG выдаётся за него.
+            image = open_image(*args, **kwargs)
+            image.format = 'MPO'
+            return image
+
+        with mock.patch('posts.uploads.Image.open', open_as_mpo):
+            self.create_post('С телефона', self.get_image(
+                'phone.jpg', 'JPEG', exif=exif.tobytes()))
+        post = Post.objects.get(text='С телефона')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn('exif', image.info)
+
+    def test_gif_keeps_animation_without_comment(self):
+        """GIF перекодируется с кадрами, но без комментария"""
+        frames = [Image.new('P', (10, 10), color) for color in (1, 2)]
+        file_obj = BytesIO()
+        frames[0].save(file_obj, 'GIF', save_all=True,
+                       append_images=frames[1:], duration=100, loop=0,
+                       comment=b'secret')
+        file_obj.name = 'animated.gif'
+        file_obj.seek(0)
+        self.create_post('Анимация', file_obj)
+        post = Post.objects.get(text='Анимация')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.n_frames, 2)
+            self.assertNotIn('comment', image.info)
+
+    def test_unsupported_format_is_rejected(self):
+        """TIFF с метаданными не сохраняется, а отклоняется"""
+        response = self.create_post('TIFF', self.get_image('scan.tiff',
+                                                           'TIFF'))
+        self.assertFalse(Post.objects.filter(text='TIFF').exists())
+        self.assertIn('не поддерживается',
+                      str(response.context['form'].errors['image']))
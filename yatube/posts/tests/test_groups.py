@@ -0,0 +1,122 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.groups import refresh_trending, with_previews
+from posts.models import Comment, Group, GroupStats, Post, TrendingGroup, User
+from posts.tests.utils import run_on_commit
+
+
+class GroupDirectoryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='groupAuthor')
+        cls.fishing = Group.objects.create(title='Рыбалка', slug='fishing',
+                                           description='Про рыбалку')
+        cls.hiking = Group.objects.create(title='Походы', slug='hiking',
+                                          description='Про походы')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def post(self, group, text='Пост', days_ago=0):
+        post = Post.objects.create(author=self.author, group=group,
+                                   text=text)
+        if days_ago:
+            pub_date = timezone.now() - timedelta(days=days_ago)
+            Post.objects.filter(pk=post.pk).update(pub_date=pub_date)
+            post.pub_date = pub_date
+        return post
+
+    def test_counters_follow_post_writes(self):
+        """Счётчик и время последней записи меняются вместе с постами"""
+        old = self.post(self.fishing, days_ago=3)
+        new = self.post(self.fishing)
+        stats = self.stats(self.fishing)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.last_post_at, new.pub_date)
+
+        new.group = self.hiking
+        new.save()
+        stats = self.stats(self.fishing)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.last_post_at, old.pub_date)
+        self.assertEqual(self.stats(self.hiking).posts_count, 1)
+
+        old.delete()
+        stats = self.stats(self.fishing)
+        self.assertEqual((stats.posts_count, stats.last_post_at), (0, None))
+
+    def test_recount_stats_repairs_group_counters(self):
+        """recount_stats исправляет счётчики групп"""
+        self.post(self.fishing)
+        GroupStats.objects.filter(group=self.fishing).update(posts_count=9)
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.fishing).posts_count, 1)
+
+    def test_previews_are_one_query(self):
+        """Последние посты всех групп страницы — одним запросом"""
+        for number in range(5):
+            self.post(self.fishing, f'Рыбалка {number}')
+        self.post(self.hiking, 'Поход')
+        with self.assertNumQueries(1):
+            groups = with_previews([self.fishing, self.hiking], size=3)
+        self.assertEqual([post.text for post in groups[0].preview],
+                         ['Рыбалка 4', 'Рыбалка 3', 'Рыбалка 2'])
+        self.assertEqual(len(groups[1].preview), 1)
+
+    def test_directory_page(self):
+        """Каталог показывает группы по активности, счётчики и превью"""
+        self.post(self.fishing, 'Старая рыбалка', days_ago=2)
+        self.post(self.hiking, 'Свежий поход')
+        refresh_trending()
+        response = Client().get(reverse('posts:group_index'))
+        self.assertContains(response, 'Свежий поход')
+        self.assertContains(response, 'Записей: 1', count=2)
+        titles = [group.title for group in response.context['groups']]
+        self.assertEqual(titles, ['Походы', 'Рыбалка'])
+        self.assertEqual(
+            [item.group for item in response.context['trending']],
+            [self.hiking, self.fishing])
+
+    def test_directory_changes_with_new_post(self):
+        """Новый пост меняет закешированный каталог"""
+        client = Client()
+        client.get(reverse('posts:group_index'))
+        with run_on_commit():
+            self.post(self.fishing, 'Только что')
+        self.assertContains(client.get(reverse('posts:group_index')),
+                            'Только что')
+
+    def test_trending_decays_with_time(self):
+        """Свежая активность весит больше, чем давняя, но частая"""
+        for _ in range(3):
+            self.post(self.fishing, days_ago=5)
+        recent = self.post(self.hiking)
+        Comment.objects.create(post=recent, author=self.author, text='Да')
+        self.post(self.hiking, days_ago=30)
+        self.assertEqual(refresh_trending(), 2)
+        ranking = list(TrendingGroup.objects.all())
+        self.assertEqual([item.group for item in ranking],
+                         [self.hiking, self.fishing])
+        self.assertAlmostEqual(ranking[0].score, 1.25, places=2)
+        self.assertAlmostEqual(ranking[1].score, 3 / 2 ** 5, places=2)
+
+    def test_group_page_uses_stored_count(self):
+        """Номерные страницы группы не считают COUNT(*) по постам"""
+        for number in range(12):
+            self.post(self.fishing, f'Пост {number}')
+        response = Client().get(
+            reverse('posts:group_posts', args=[self.fishing.slug]),
+            {'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), 2)
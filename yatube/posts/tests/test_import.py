@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.importer import _assign_ids
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+from posts.search import search
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='importAuthor')
+        cls.reader = User.objects.create_user(username='importReader')
+        cls.group = Group.objects.create(
+            title='Импорт', slug='import', description='Описание')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.source, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_file(self, path, **options):
+        stderr = StringIO()
+        call_command('import_posts', path, batch_size=2,
+                     media_source=self.source, stdout=StringIO(),
+                     stderr=stderr, **options)
+        return stderr.getvalue()
+
+    def test_import_jsonl(self):
+        """JSONL: посты, комментарии и подписки со ссылками и датами"""
+        with open(os.path.join(self.source, 'pic.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        records = [
+            {'id': 'a1', 'author': 'importAuthor', 'group': 'import',
+             'text': 'Импортированный пост про щуку',
+             'pub_date': '2015-03-01T10:00:00', 'image': 'pic.gif'},
+            {'id': 'a2', 'author': 'importAuthor', 'text': 'Второй пост'},
+            {'type': 'comment', 'post': 'a1', 'author': 'importReader',
+             'text': 'Комментарий', 'created': '2015-03-02T10:00:00'},
+            {'type': 'follow', 'user': 'importReader',
+             'author': 'importAuthor'},
+            {'type': 'comment', 'post': 'missing', 'author': 'importReader',
+             'text': 'Без поста'},
+        ]
+        path = self.write('data.jsonl', '\n'.join(
+            json.dumps(record) for record in records) + '\nне json\n')
+        errors = self.import_file(path)
+
+        self.assertIn('строка 5', errors)
+        self.assertIn('строка 6', errors)
+        post = Post.objects.get(text__startswith='Импортированный')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertTrue(post.image.name.startswith('posts/pic'))
+        self.assertEqual(post.comments_count, 1)
+        comment = Comment.objects.get(post=post)
+        self.assertEqual(comment.created.year, 2015)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (2, 1))
+        self.assertEqual([found.id for found in search('щуку')], [post.id])
+
+    def test_import_csv_creates_missing(self):
+        """CSV с созданием неизвестных авторов и групп"""
+        path = self.write('data.csv', (
+            'author,group,text\n'
+            'newAuthor,new-group,Пост из CSV\n'
+            'otherAuthor,,\n'
+        ))
+        errors = self.import_file(path, create_users=True,
+                                  create_groups=True)
+        self.assertIn('строка 3', errors)
+        post = Post.objects.get(text='Пост из CSV')
+        self.assertEqual(post.author.username, 'newAuthor')
+        self.assertEqual(post.group.slug, 'new-group')
+
+    def test_unknown_author_is_skipped(self):
+        """Без --create-users неизвестный автор — ошибка строки"""
+        path = self.write('data.jsonl', json.dumps(
+            {'author': 'nobody', 'text': 'Пост'}))
+        errors = self.import_file(path)
+        self.assertIn('nobody', errors)
+        self.assertFalse(Post.objects.filter(text='Пост').exists())
+
+    def test_ids_are_assigned_under_write_lock(self):
+        """MAX(pk) читается только после блокировки записи"""
+        post = Post(author=self.author, text='Ключ')
+        with CaptureQueriesContext(connection) as queries:
+            _assign_ids(Post, [post])
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertTrue(sql[0].startswith('UPDATE'))
+        self.assertIn('MAX(', sql[1])
+        self.assertIsNotNone(post.pk)
@@ -0,0 +1,149 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs import worker
+from jobs.models import Job
+from jobs.queue import schedule_periodic, task
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.tests.utils import run_on_commit
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.broken', max_attempts=2)
+def broken():
+    raise RuntimeError('сломалось')
+
+
+class SyncTaskTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_sync_mode_runs_task_at_once(self):
+        """В режиме TASKS_SYNC задача выполняется после фиксации, без Job"""
+        with run_on_commit():
+            self.assertIsNone(record.delay(1))
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(TASKS_SYNC=False, TIMELINE_MODE='push')
+class QueuedTaskTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_task_waits_for_worker(self):
+        """Задача ждёт воркера и выполняется им один раз"""
+        job = record.delay(1)
+        self.assertEqual(calls, [])
+        self.assertEqual(worker.work(), 1)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(worker.work(), 0)
+
+    def test_key_makes_task_idempotent(self):
+        """Задача с тем же ключом повторно не ставится"""
+        self.assertIsNotNone(record.delay(1, key='once'))
+        self.assertIsNone(record.delay(2, key='once'))
+        worker.work()
+        self.assertEqual(calls, [1])
+
+    def test_countdown_delays_task(self):
+        """Отложенная задача не выполняется раньше срока"""
+        record.delay(1, countdown=60)
+        self.assertEqual(worker.work(), 0)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Упавшая задача откладывается и после max_attempts — failed"""
+        job = broken.delay()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            worker.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('сломалось', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            worker.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_job_is_claimed_once(self):
+        """Задачу забирает только один воркер, пока не истекла аренда"""
+        record.delay(1)
+        self.assertEqual(len(worker.claim(10)), 1)
+        self.assertEqual(worker.claim(10), [])
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(worker.claim(10)), 1)
+
+    def test_lost_lease_does_not_overwrite_result(self):
+        """Итог задачи с истёкшей арендой не затирает новую попытку"""
+        record.delay(1)
+        [stale] = worker.claim(10)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [fresh] = worker.claim(10)
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            worker.run(stale)
+        fresh.refresh_from_db()
+        self.assertEqual((fresh.status, fresh.attempts), (Job.RUNNING, 2))
+        worker.run(fresh)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, Job.DONE)
+
+    @override_settings(TASK_BACKOFF_SECONDS=2, TASK_BACKOFF_MAX=10)
+    def test_backoff_grows_and_is_capped(self):
+        """Пауза между повторами растёт вдвое до TASK_BACKOFF_MAX"""
+        with mock.patch('jobs.worker.random.random', return_value=0.5):
+            self.assertEqual([worker.backoff(n) for n in (1, 2, 3, 5)],
+                             [2, 4, 8, 10])
+
+    def test_periodic_task_is_queued_once_per_period(self):
+        """Периодическая задача ставится один раз за период"""
+        moment = timezone.now()
+        with mock.patch.dict('jobs.queue.periodic', {'tests.record': 60},
+                             clear=True), \
+                mock.patch.dict('jobs.queue._scheduled', clear=True):
+            schedule_periodic(moment)
+            schedule_periodic(moment)
+            self.assertEqual(Job.objects.filter(name='tests.record').count(),
+                             1)
+            # Другой процесс не знает о постановке, но ключ тот же.
+            with mock.patch.dict('jobs.queue._scheduled', clear=True):
+                schedule_periodic(moment)
+            self.assertEqual(Job.objects.count(), 1)
+            schedule_periodic(moment + timedelta(seconds=60))
+            self.assertEqual(Job.objects.count(), 2)
+
+    def test_run_workers_once(self):
+        """run_workers --once выполняет очередь и завершается"""
+        for value in range(3):
+            record.delay(value)
+        out = StringIO()
+        with mock.patch.dict('jobs.queue.periodic', clear=True):
+            call_command('run_workers', once=True, stdout=out)
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertIn('3', out.getvalue())
+
+    def test_post_fan_out_is_handed_off(self):
+        """Раскладка поста по лентам выполняется воркером, а не запросом"""
+        author = User.objects.create_user(username='jobAuthor')
+        reader = User.objects.create_user(username='jobReader')
+        Follow.objects.create(user=reader, author=author)
+        worker.work()
+        post = Post.objects.create(author=author, text='В очередь')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        worker.work()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post=post).exists())
@@ -0,0 +1,66 @@
+import re
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import registry
+from posts.models import Post, User
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='metricsAuthor')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.guest_client = Client()
+
+    def scrape(self, **extra):
+        return self.guest_client.get(reverse('metrics'), **extra)
+
+    def test_request_is_measured_by_view_name(self):
+        """Запрос попадает в гистограммы под именем view"""
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        body = self.scrape(HTTP_AUTHORIZATION='Bearer secret').content
+        body = body.decode()
+        self.assertIn('yatube_requests_sampled_total'
+                      '{view="posts:index",status="200"} 2', body)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="posts:index"} 2', body)
+        self.assertIn('yatube_db_queries_bucket'
+                      '{view="posts:index",le="+Inf"} 2', body)
+        self.assertIn('yatube_template_duration_seconds_sum'
+                      '{view="posts:index"}', body)
+        # Фрагмент index_page: промах при первом запросе, затем попадание.
+        for name in ('hits', 'misses'):
+            count = re.search(
+                rf'yatube_cache_{name}_total{{view="posts:index"}} (\d+)',
+                body)
+            self.assertGreater(int(count.group(1)), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_sampling_skips_requests(self):
+        """Запросы вне выборки не записываются"""
+        self.guest_client.get(reverse('posts:index'))
+        body = self.scrape(HTTP_AUTHORIZATION='Bearer secret').content
+        self.assertNotIn(b'posts:index', body)
+
+    def test_endpoint_is_protected(self):
+        """/metrics/ закрыт для гостей и открыт персоналу"""
+        response = self.scrape()
+        self.assertEqual(response.status_code, 302)
+        response = self.scrape(HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='metricsStaff',
+                                         is_staff=True)
+        self.guest_client.force_login(staff)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
@@ -0,0 +1,90 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.paginator import CursorPaginator
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cursorAuthor')
+        cls.group = Group.objects.create(
+            title='Курсоры',
+            slug='cursors',
+            description='Группа для проверки курсоров',
+        )
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+             for i in range(13)]
+        )
+        # Одинаковая дата у всех постов: порядок держится на id.
+        Post.objects.update(pub_date=timezone.now())
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_walks_all_posts_without_duplicates(self):
+        """Курсоры проходят ленту целиком без повторов и пропусков"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        ids = [post.id for post in first] + [post.id for post in second]
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-id')
+                      .values_list('id', flat=True)))
+        self.assertEqual(second.number, 2)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает ту же первую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual([post.id for post in back],
+                         [post.id for post in first])
+        self.assertIsNone(first.previous_cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Битый курсор не роняет страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_feed_pages_do_not_offset(self):
+        """Курсорная страница не использует OFFSET"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                cursor = first.context['page_obj'].next_cursor
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(f'{url}?cursor={cursor}')
+                self.assertEqual(len(response.context['page_obj']), 3)
+                for query in queries.captured_queries:
+                    self.assertNotIn('OFFSET', query['sql'])
+
+    def test_index_does_not_count(self):
+        """Главная страница не выполняет COUNT(*)"""
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('posts:index'))
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_legacy_page_links_still_work(self):
+        """Старые ссылки ?page=N продолжают работать"""
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertContains(response, '?page=1')
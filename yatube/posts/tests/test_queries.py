@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+from posts.stats import recount_all
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Запросы',
+            slug='queries',
+            description='Группа для подсчёта запросов',
+        )
+        User.objects.bulk_create(
+            [User(username=f'writer{i}', first_name=f'Имя{i}')
+             for i in range(12)]
+        )
+        authors = list(User.objects.filter(username__startswith='writer'))
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=author, group=cls.group)
+             for i, author in enumerate(authors)]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=cls.reader, author=author) for author in authors]
+        )
+        # bulk_create обходит сигналы, счётчики нужно пересчитать.
+        recount_all()
+        cls.author = authors[0]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_count_is_fixed(self):
+        """Число запросов на страницу ленты не зависит от числа постов"""
+        feeds = {
+            reverse('posts:index'): (self.guest_client, 1),
+            reverse('posts:group_posts', args=[self.group.slug]): (
+                self.guest_client, 2),
+            reverse('posts:profile', args=[self.author.username]): (
+                self.guest_client, 2),
+            reverse('posts:follow_index'): (self.authorized_client, 3),
+        }
+        for url, (client, expected) in feeds.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(expected):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class FeedIndexesTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не читают таблицы целиком"""
+        out = StringIO()
+        call_command('check_feed_indexes', stdout=out)
+        self.assertNotIn('полный просмотр', out.getvalue())
+
+    def test_follow_is_unique(self):
+        """Повторная подписка запрещена на уровне базы"""
+        user = User.objects.create_user(username='uniqueReader')
+        author = User.objects.create_user(username='uniqueAuthor')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
@@ -0,0 +1,123 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import routers
+from core.metrics import registry
+from posts.models import Post, User
+from posts.recompute import LOCK_KEY, cached
+
+
+class RecomputeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        routers.reset()
+        self.calls = 0
+
+    def compute(self, value='новое', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def events(self, name):
+        return registry.events[name]['test']
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи пересчитывают значение один раз"""
+        results = []
+
+        def worker():
+            results.append(cached('key', self.compute(delay=0.2), 60, 1,
+                                  name='test'))
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['новое'] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.events('yatube_recompute_coalesced_total'), 4)
+
+    def test_stale_value_served_while_recomputing(self):
+        """Пока значение пересчитывают, остальные получают прежнее"""
+        cached('key', self.compute('старое'), 60, 1, name='test')
+        cache.add(LOCK_KEY.format('key'), 'other', 30)
+        self.assertEqual(cached('key', self.compute(), 60, 2, name='test'),
+                         'старое')
+        self.assertEqual(self.events('yatube_recompute_stale_total'), 1)
+        cache.delete(LOCK_KEY.format('key'))
+        self.assertEqual(cached('key', self.compute(), 60, 2, name='test'),
+                         'новое')
+        self.assertEqual(self.calls, 2)
+
+    @override_settings(STAMPEDE_LOCK_WAIT=0.1)
+    def test_strict_version_waits_for_new_value(self):
+        """С strict_version прежняя версия не отдаётся даже без замка"""
+        cached('key', self.compute('старое'), 60, 1, name='test')
+        cache.add(LOCK_KEY.format('key'), 'other', 30)
+        self.assertEqual(cached('key', self.compute(), 60, 2, name='test',
+                                strict_version=True), 'новое')
+        self.assertEqual(self.events('yatube_recompute_stale_total'), 0)
+
+    def test_strict_version_serves_stale_with_on_stale(self):
+        """С on_stale прежняя версия отдаётся сразу, а ответ помечается"""
+        cached('key', self.compute('старое'), 60, 1, name='test')
+        cache.add(LOCK_KEY.format('key'), 'other', 30)
+        on_stale = mock.Mock()
+        self.assertEqual(cached('key', self.compute(), 60, 2, name='test',
+                                strict_version=True, on_stale=on_stale),
+                         'старое')
+        on_stale.assert_called_once_with()
+        self.assertEqual(self.events('yatube_recompute_stale_total'), 1)
+
+    def test_writer_does_not_get_stale_value(self):
+        """После своей записи пользователь не видит прежнее значение"""
+        cached('key', self.compute('старое'), 60, 1, name='test')
+        cache.add(LOCK_KEY.format('key'), 'other', 30)
+        routers.pin_to_primary()
+        self.assertEqual(cached('key', self.compute(), 60, 2, name='test'),
+                         'новое')
+
+    def test_early_recomputation_near_expiry(self):
+        """Незадолго до срока значение пересчитывается заранее"""
+        cached('key', self.compute('старое', delay=0.05), 0.5, 1,
+               name='test')
+        with mock.patch('posts.recompute.random.random',
+                        return_value=0.99999):
+            self.assertEqual(cached('key', self.compute(), 0.5, 1,
+                                    name='test'), 'новое')
+        self.assertEqual(self.events('yatube_recompute_early_total'), 1)
+        with mock.patch('posts.recompute.random.random', return_value=0.0):
+            cached('key', self.compute('ещё новее'), 0.5, 1, name='test')
+        self.assertEqual(self.calls, 2)
+
+    def test_events_are_rendered(self):
+        """Счётчики пересчётов попадают в /metrics/"""
+        cached('key', self.compute(), 60, 1, name='test')
+        self.assertIn('yatube_recompute_total{key="test"} 1',
+                      registry.render())
+
+
+class FeedCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='countAuthor')
+        Post.objects.create(author=author, text='Пост для счётчика')
+
+    def test_page_count_is_cached_per_version(self):
+        """COUNT(*) для ?page=N не повторяется, пока лента не изменилась"""
+        url = reverse('posts:index')
+        Client().get(url, {'page': 1})
+        with CaptureQueriesContext(connection) as queries:
+            Client().get(url, {'page': 2})
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
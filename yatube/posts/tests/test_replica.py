@@ -0,0 +1,95 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core import metrics, routers
+from core.middleware import PIN_COOKIE
+from posts.models import Group, Post, User
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(TransactionTestCase):
+    """Реплика — отдельный файл SQLite, снимок основной базы."""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = dict(
+            connection.settings_dict,
+            NAME=os.path.join(cls.directory, 'replica.sqlite3'),
+            TEST={'MIRROR': None},
+        )
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        if hasattr(connections._connections, REPLICA):
+            delattr(connections._connections, REPLICA)
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        routers.reset()
+        self.author = User.objects.create_user(username='replicaAuthor')
+        self.group = Group.objects.create(
+            title='Реплика', slug='replica', description='Описание')
+        self.sync_replica()
+        routers.reset()
+
+    def sync_replica(self):
+        """Копирует основную базу в файл реплики («репликация»)."""
+        connections[REPLICA].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections[REPLICA].settings_dict['NAME'])
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+
+    def test_reads_go_to_replica_writes_to_primary(self):
+        """Чтение — с реплики, запись — в основную базу"""
+        Post.objects.create(author=self.author, text='Только в основной')
+        routers.reset()
+        self.assertEqual(Post.objects.db, REPLICA)
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(Post.objects.using('default').exists())
+        self.sync_replica()
+        self.assertTrue(Post.objects.exists())
+
+    def test_writer_is_pinned_to_primary(self):
+        """После записи пользователь видит свой пост, другие — нет"""
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('posts:post_create'),
+                    {'text': 'Свежий пост', 'group': self.group.id})
+        self.assertIn(PIN_COOKIE, client.cookies)
+        group_url = reverse('posts:group_posts', args=[self.group.slug])
+        self.assertContains(client.get(group_url), 'Свежий пост')
+
+        guest = Client()
+        response = guest.get(group_url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertNotIn(PIN_COOKIE, guest.cookies)
+
+    def test_metrics_count_replica_queries(self):
+        """Метрики запроса считают и чтение с реплики"""
+        # Соединения уже открыты: их настройка не в счёт.
+        Post.objects.exists()
+        Post.objects.using('default').exists()
+        stats = metrics.RequestStats()
+        with metrics.measuring(stats):
+            Post.objects.exists()
+            Post.objects.using('default').exists()
+        self.assertEqual(stats.queries, 2)
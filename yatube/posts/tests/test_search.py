@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.search import FTS_TABLE
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searchAuthor')
+        cls.group = Group.objects.create(
+            title='Рыбалка',
+            slug='fishing',
+            description='Всё о рыбалке',
+        )
+        cls.pike = Post.objects.create(
+            author=cls.author, text='Поймал щуку на спиннинг')
+        cls.double_pike = Post.objects.create(
+            author=cls.author, text='Щука, снова щука и ещё одна щука')
+        cls.in_group = Post.objects.create(
+            author=cls.author, text='Утренний клёв', group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query):
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': query})
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_by_text_is_ranked(self):
+        """Поиск находит посты по тексту, более релевантные выше"""
+        self.assertEqual(self.found('ЩУК'),
+                         [self.double_pike.id, self.pike.id])
+
+    def test_search_by_group_title(self):
+        """Поиск находит посты по названию группы"""
+        self.assertEqual(self.found('рыбалка'), [self.in_group.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        pike = Post.objects.get(pk=self.pike.pk)
+        pike.text = 'Поймал окуня'
+        pike.save()
+        self.assertEqual(self.found('окуня'), [pike.id])
+        Post.objects.get(pk=self.double_pike.pk).delete()
+        self.assertEqual(self.found('щук'), [])
+
+    def test_group_rename_reindexes_posts(self):
+        """Переименование группы меняет выдачу"""
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Охота'
+        group.save()
+        self.assertEqual(self.found('охота'), [self.in_group.id])
+        self.assertEqual(self.found('рыбалка'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS во вводе не ломают поиск"""
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': '"щука" OR (NEAR *'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_search_index(self):
+        """rebuild_search_index восстанавливает индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.found('клёв'), [])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.found('клёв'), [self.in_group.id])
+
+    def test_admin_uses_search_index(self):
+        """Поиск в админке идёт через индекс"""
+        admin = User.objects.create_superuser(
+            'searchAdmin', 'admin@yatube.ru', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get('/admin/posts/post/', {'q': 'спиннинг'})
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            [self.pike.id])
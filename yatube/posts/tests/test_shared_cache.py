@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache_backends import create_cache
+from posts.cache import bump_version, get_version
+from posts.models import Post, User
+from posts.tests.utils import run_on_commit
+
+
+def sqlite_config(directory):
+    return {'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3')}
+
+
+def tiered_config(directory, location='tiered', **options):
+    return {'BACKEND': 'core.cache_backends.tiered.TieredCache',
+            'LOCATION': location,
+            'OPTIONS': dict({'SHARED': sqlite_config(directory)}, **options)}
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_sqlite_cache_is_shared_between_instances(self):
+        """Два экземпляра на одном файле (воркеры) видят записи друг друга"""
+        first = create_cache(sqlite_config(self.directory))
+        second = create_cache(sqlite_config(self.directory))
+        first.set('key', {'value': 1})
+        self.assertEqual(second.get('key'), {'value': 1})
+        self.assertFalse(second.add('key', 'other'))
+        second.set('counter', 1)
+        self.assertEqual(first.incr('counter', 4), 5)
+        self.assertEqual(second.get_many(['key', 'counter', 'missing']),
+                         {'key': {'value': 1}, 'counter': 5})
+        second.delete('key')
+        self.assertIsNone(first.get('key'))
+
+    def test_sqlite_cache_expires_values(self):
+        """Просроченное значение не отдаётся, и на его место работает add"""
+        backend = create_cache(sqlite_config(self.directory))
+        backend.set('key', 'old', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(backend.get('key'))
+        self.assertTrue(backend.add('key', 'new'))
+        self.assertEqual(backend.get('key'), 'new')
+
+    def test_tiered_cache_serves_hits_from_memory(self):
+        """Попадание берётся из памяти процесса, без общего уровня"""
+        backend = create_cache(tiered_config(self.directory))
+        backend.set('fragment', 'html')
+        backend.shared.clear()
+        self.assertEqual(backend.get('fragment'), 'html')
+
+    def test_tiered_cache_reads_versions_from_shared_tier(self):
+        """Сдвиг версии в другом процессе виден сразу"""
+        backend = create_cache(tiered_config(self.directory, 'first'))
+        other = create_cache(tiered_config(self.directory, 'second'))
+        backend.set('version:posts', 1, None)
+        self.assertEqual(backend.get('version:posts'), 1)
+        other.set('version:posts', 2, None)
+        self.assertEqual(backend.get('version:posts'), 2)
+        self.assertEqual(backend.get_many(['version:posts']),
+                         {'version:posts': 2})
+
+    def test_concurrent_bumps_are_not_lost(self):
+        """Параллельные сдвиги версии не сливаются в один"""
+        with override_settings(CACHES={
+                'default': sqlite_config(self.directory)}):
+            before = get_version('bumps')
+
+            def bump():
+                for _ in range(50):
+                    bump_version('bumps')
+            threads = [threading.Thread(target=bump) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(get_version('bumps'), before + 200)
+
+    def test_tiered_cache_bounds_local_staleness(self):
+        """Прочие ключи живут в памяти не дольше LOCAL_TIMEOUT"""
+        backend = create_cache(tiered_config(
+            self.directory, 'first', LOCAL_TIMEOUT=0.05))
+        other = create_cache(tiered_config(self.directory, 'second'))
+        backend.set('key', 'old')
+        other.set('key', 'new')
+        self.assertEqual(backend.get('key'), 'old')
+        time.sleep(0.1)
+        self.assertEqual(backend.get('key'), 'new')
+
+    def test_site_works_on_tiered_cache(self):
+        """Фрагменты лент сбрасываются и на двухуровневом кеше"""
+        author = User.objects.create_user(username='tieredAuthor')
+        with override_settings(CACHES={
+                'default': tiered_config(self.directory, 'site')}):
+            cache.clear()
+            client = Client()
+            client.get(reverse('posts:index'))
+            with run_on_commit():
+                Post.objects.create(author=author, text='Пост в общем кеше')
+            self.assertContains(client.get(reverse('posts:index')),
+                                'Пост в общем кеше')
+            cache.clear()
+
+    def test_cache_benchmark_command(self):
+        """run_cache_benchmark замеряет все уровни"""
+        out = StringIO()
+        call_command('run_cache_benchmark', keys=5, rounds=1, stdout=out)
+        for tier in ('locmem', 'file', 'sqlite', 'tiered+sqlite'):
+            self.assertIn(tier, out.getvalue())
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import stats
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='statsAuthor')
+        cls.reader = User.objects.create_user(username='statsReader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счётчик постов меняется при создании и удалении поста"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики подписчиков и подписок"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев хранится в посте"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """recount_stats исправляет разъехавшиеся счётчики"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_counters_stop_at_zero(self):
+        """Лишний вычет оставляет счётчик нулём, а не роняет запись"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        stats.change(self.author.pk, posts_count=-1, followers_count=-2)
+        stats.change_comments(post.pk, -1)
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_missing_row_is_created_once(self):
+        """Недостающая строка создаётся пересчётом без двойного сдвига"""
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).delete()
+        stats.change(self.author.pk, posts_count=1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        stats.change(self.author.pk, posts_count=1)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
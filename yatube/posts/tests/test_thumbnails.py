@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+from posts import thumbnails
+from posts.cache import follow_feed_scope, get_version
+from posts.models import Follow, Post, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='thumbAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def upload(self, name):
+        return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                                  content_type='image/gif')
+
+    def test_thumbnail_is_built_when_post_is_saved(self):
+        """Миниатюра строится при сохранении поста, а не при просмотре"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': self.upload('a.gif')},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=[post.id]))
+        self.assertContains(response, f'{settings.MEDIA_URL}cache/')
+
+    @override_settings(THUMBNAIL_ASYNC=True)
+    def test_page_falls_back_to_original_image(self):
+        """Пока миниатюры нет, показывается исходная картинка"""
+        post = Post.objects.create(author=self.author, text='Без миниатюры',
+                                   image=self.upload('b.gif'))
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', args=[post.id]))
+        self.assertContains(response, post.image.url)
+        schedule.assert_called_once_with(post.image.name)
+
+    @override_settings(THUMBNAIL_ASYNC=True)
+    def test_renders_do_not_repeat_schedule(self):
+        """Повторные показы без миниатюры не ставят задачу снова"""
+        post = Post.objects.create(author=self.author, text='Без миниатюры',
+                                   image=self.upload('d.gif'))
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            thumbnails.ready_thumbnail(post.image)
+            thumbnails.ready_thumbnail(post.image)
+        schedule.assert_called_once_with(post.image.name)
+
+    def test_refresh_posts_updates_follower_feeds(self):
+        """Готовая миниатюра обновляет и ленты подписчиков автора"""
+        reader = User.objects.create_user(username='thumbReader')
+        Follow.objects.create(user=reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='С картинкой',
+                                   image=self.upload('e.gif'))
+        before = get_version(follow_feed_scope(reader.id))
+        thumbnails.refresh_posts(post.image.name)
+        self.assertNotEqual(get_version(follow_feed_scope(reader.id)),
+                            before)
+
+    @override_settings(THUMBNAIL_ASYNC=True, TASKS_SYNC=False)
+    def test_repeated_schedule_is_one_job(self):
+        """Повторная постановка миниатюры не создаёт вторую задачу"""
+        thumbnails.schedule('posts/c.gif')
+        thumbnails.schedule('posts/c.gif')
+        self.assertEqual(Job.objects.filter(key='thumbnail:posts/c.gif')
+                         .count(), 1)
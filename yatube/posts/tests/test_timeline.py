@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.tests.utils import run_on_commit
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timelineAuthor')
+        cls.star = User.objects.create_user(username='timelineStar')
+        cls.reader = User.objects.create_user(username='timelineReader')
+        cls.fans = [User.objects.create_user(username=f'fan{i}')
+                    for i in range(2)]
+        Post.objects.create(author=cls.author, text='Старый пост автора')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:follow_index')
+
+    def feed_texts(self):
+        response = self.client.get(self.url)
+        return [post.text for post in response.context['page_obj']]
+
+    @override_settings(TIMELINE_MODE='push')
+    def test_push_mode_fans_out_and_backfills(self):
+        """В режиме push лента хранится в TimelineEntry"""
+        with run_on_commit():
+            self.client.get(reverse('posts:profile_follow',
+                                    args=[self.author.username]))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 1)
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый пост автора')
+        self.assertEqual(self.feed_texts(),
+                         ['Новый пост автора', 'Старый пост автора'])
+
+    @override_settings(TIMELINE_MODE='push')
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.get(user=self.reader, author=self.author).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(TIMELINE_MODE='hybrid',
+                       TIMELINE_CELEBRITY_FOLLOWERS=3)
+    def test_hybrid_mode_pulls_celebrities(self):
+        """В режиме hybrid посты популярных авторов не раскладываются"""
+        with run_on_commit():
+            for fan in self.fans:
+                Follow.objects.create(user=fan, author=self.star)
+            Follow.objects.create(user=self.reader, author=self.star)
+            Follow.objects.create(user=self.reader, author=self.author)
+            Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists())
+        self.assertEqual(self.feed_texts(),
+                         ['Пост звезды', 'Старый пост автора'])
+
+    @override_settings(TIMELINE_MODE='hybrid',
+                       TIMELINE_CELEBRITY_FOLLOWERS=3)
+    def test_crossing_threshold_rebalances_timelines(self):
+        """Переход порога в обе стороны перестраивает ленты подписчиков"""
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.star)
+            Post.objects.create(author=self.star, text='Пост до славы')
+            for fan in self.fans:
+                Follow.objects.create(user=fan, author=self.star)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.star).exists())
+        with run_on_commit():
+            Post.objects.create(author=self.star, text='Пост звезды')
+            Follow.objects.filter(user=self.fans[0]).delete()
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader, post__author=self.star).count(), 2)
+        self.assertEqual(self.feed_texts(), ['Пост звезды', 'Пост до славы'])
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def run_on_commit():
+    """
+    Выполняет on_commit-колбэки, поставленные внутри блока: TestCase не
+    фиксирует транзакцию и сам их не вызывает (в Django 3.2 то же делает
+    captureOnCommitCallbacks(execute=True)).
+    """
+    start = len(connection.run_on_commit)
+    yield
+    # Колбэк может поставить новые: например, задача в режиме TASKS_SYNC.
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
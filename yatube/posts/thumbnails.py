@@ -0,0 +1,100 @@
+"""
+Заранее подготовленные миниатюры картинок постов.
+
+Миниатюра для ленты строится фоновой задачей (posts.tasks) сразу после
+сохранения поста, а шаблоны берут её только из хранилища sorl-thumbnail:
+пока миниатюры нет, показывается исходная картинка и запрос не ждёт PIL.
+"""
+import logging
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .cache import bump_version, follow_feed_scope, post_scopes
+from .models import Follow, Post
+
+logger = logging.getLogger(__name__)
+
+FEED_GEOMETRY = '960x339'
+FEED_OPTIONS = {'crop': 'center', 'upscale': True}
+SCHEDULED_KEY = 'thumbnail_scheduled:{}'
+
+
+def _thumbnail_file(name):
+    """Файл миниатюры с теми же опциями, что выставляет sorl-thumbnail."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(FEED_OPTIONS)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(thumbnail_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, FEED_GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def build(name):
+    """Строит миниатюру для ленты; ошибки PIL и хранилища не глушит."""
+    get_thumbnail(name, FEED_GEOMETRY, **FEED_OPTIONS)
+
+
+def generate(name):
+    """Строит миниатюру для ленты сразу, ошибку только пишет в лог."""
+    try:
+        build(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', name)
+
+
+def refresh_posts(name):
+    """
+    Фрагменты, закешированные с исходной картинкой, устаревают: иначе
+    миниатюра появилась бы в ленте только через FRAGMENT_CACHE_TIMEOUT.
+    """
+    posts = Post.objects.filter(image=name)
+    rows = posts.values_list('id', 'author__username', 'group__slug')
+    followers = Follow.objects.filter(
+        author__in=posts.values('author_id')).values_list(
+        'user_id', flat=True).distinct()
+    bump_version(*(scope for row in rows for scope in post_scopes(*row)),
+                 *(follow_feed_scope(user_id) for user_id in followers))
+
+
+def schedule(name):
+    """
+    Ставит построение миниатюры в очередь. Повторы отсекает ключ задачи,
+    а не память процесса: она росла бы без конца и не видела других.
+    """
+    if not name:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate(name)
+        return
+    # tasks импортирует этот модуль.
+    from .tasks import build_thumbnail
+    build_thumbnail.delay(name, key=f'thumbnail:{name}')
+
+
+def ready_thumbnail(image):
+    """
+    Готовая миниатюра или None. Недостающую ставит в очередь задач, но
+    никогда не строит сама: шаблон не должен ждать PIL. Повторно — не
+    чаще раза в THUMBNAIL_RETRY_SECONDS: каждая постановка пишет в базу.
+    """
+    if not image:
+        return None
+    thumbnail = default.kvstore.get(_thumbnail_file(image.name))
+    if thumbnail is None and settings.THUMBNAIL_ASYNC and cache.add(
+            SCHEDULED_KEY.format(quote(image.name)), True,
+            settings.THUMBNAIL_RETRY_SECONDS):
+        schedule(image.name)
+    return thumbnail
@@ -0,0 +1,117 @@
+"""
+Лента подписок в трёх режимах (settings.TIMELINE_MODE):
+
+* pull — лента собирается запросом через Follow при каждом просмотре;
+* push — при публикации пост раскладывается по TimelineEntry подписчиков;
+* hybrid — как push, но авторы, у которых подписчиков не меньше
+  TIMELINE_CELEBRITY_FOLLOWERS, остаются в режиме pull. Число
+  подписчиков берётся из AuthorStats, а при переходе порога ленты
+  подписчиков перестраивает задача (rebalance).
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+PULL = 'pull'
+PUSH = 'push'
+HYBRID = 'hybrid'
+
+
+def get_mode():
+    return getattr(settings, 'TIMELINE_MODE', PULL)
+
+
+def is_celebrity(author_id):
+    return get_mode() == HYBRID and AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).exists()
+
+
+def crosses_threshold(before, after):
+    """Число подписчиков перешло TIMELINE_CELEBRITY_FOLLOWERS."""
+    threshold = settings.TIMELINE_CELEBRITY_FOLLOWERS
+    return get_mode() == HYBRID and (
+        (before >= threshold) != (after >= threshold))
+
+
+def _pushes(author_id):
+    return get_mode() != PULL and not is_celebrity(author_id)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not _pushes(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """После подписки добавляет в ленту последние посты автора."""
+    if not _pushes(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts[:settings.TIMELINE_BACKFILL_SIZE]],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """После отписки убирает посты автора из ленты."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def follow_posts(user):
+    """Посты ленты подписок пользователя для текущего режима."""
+    mode = get_mode()
+    if mode == PULL:
+        return Post.objects.for_feed().filter(author__following__user=user)
+    condition = Q(id__in=TimelineEntry.objects.filter(
+        user=user).values('post_id'))
+    if mode == HYBRID:
+        celebrities = Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_CELEBRITY_FOLLOWERS),
+        ).values('author')
+        condition |= Q(author__in=celebrities)
+    return Post.objects.for_feed().filter(condition)
+
+
+def rebalance(author_id):
+    """
+    Ленты подписчиков автора, пересёкшего порог: знаменитость читается
+    запросом, и разложенные записи больше не нужны; а кто перестал ею
+    быть, тому ленты дополняются постами, которые раньше читались
+    запросом. Смотрит на текущее число подписчиков, так что повтор
+    или опоздание задачи ничего не портят.
+    """
+    if get_mode() != HYBRID:
+        return
+    if is_celebrity(author_id):
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+        return
+    for user_id in Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True).iterator():
+        backfill(user_id, author_id)
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя, например после смены режима."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True):
+        backfill(user_id, author_id)
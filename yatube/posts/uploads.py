@@ -0,0 +1,137 @@
+"""
+Загрузка картинок с ограничениями по памяти.
+
+* SizeLimitUploadHandler перестаёт сохранять файл, как только он
+  превысил UPLOAD_MAX_BYTES, и отдаёт пустую «метку»: любое поле
+  forms.ImageField (и в админке) при чтении получает ошибку валидации;
+* число пикселей проверяется по заголовку, до полного декодирования;
+* картинка перекодируется без метаданных (EXIF и т.п.) в файл, который
+  держится в памяти только до FILE_UPLOAD_MAX_MEMORY_SIZE; форматы,
+  которые не перекодируются, отклоняются: в них остались бы EXIF и GPS.
+"""
+import os
+import threading
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# Формат загрузки -> формат и расширение после перекодирования. MPO —
+# JPEG с камер телефонов (несколько кадров), из него остаётся первый.
+REENCODE_FORMATS = {
+    'JPEG': ('JPEG', 'jpeg'),
+    'MPO': ('JPEG', 'jpeg'),
+    'PNG': ('PNG', 'png'),
+    'WEBP': ('WEBP', 'webp'),
+    'GIF': ('GIF', 'gif'),
+}
+# Из info сохраняются только эти ключи, остальное — метаданные.
+KEEP_INFO = ('transparency', 'duration', 'loop', 'background')
+
+_decode_slots = None
+_decode_lock = threading.Lock()
+
+
+class OversizedUploadedFile(UploadedFile):
+    """Метка вместо файла, превысившего лимит: данные не сохранены."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+    def read(self, *args, **kwargs):
+        # forms.ImageField.to_python читает загрузку до проверки картинки.
+        raise too_large_error()
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Отбрасывает загрузку, как только она превысила UPLOAD_MAX_BYTES."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            self.too_large = True
+        return None if self.too_large else raw_data
+
+    def file_complete(self, file_size):
+        if self.too_large:
+            return OversizedUploadedFile(
+                self.file_name, self.content_type, self.received)
+        return None
+
+
+def too_large_error():
+    return ValidationError(
+        'Файл слишком большой: не больше %(limit)s МБ.',
+        code='too_large',
+        params={'limit': settings.UPLOAD_MAX_BYTES // (1024 * 1024)},
+    )
+
+
+def check_pixels(upload):
+    """
+    Проверяет число пикселей по заголовку: forms.ImageField уже открыл
+    картинку и вызвал verify(), но пиксели ещё не декодированы.
+    """
+    width, height = upload.image.size
+    if width * height > settings.UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s пикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def _slots():
+    global _decode_slots
+    with _decode_lock:
+        if _decode_slots is None:
+            _decode_slots = threading.BoundedSemaphore(
+                settings.UPLOAD_MAX_CONCURRENT_DECODES)
+        return _decode_slots
+
+
+def unsupported_format_error(image_format):
+    return ValidationError(
+        'Формат %(format)s не поддерживается: загрузите JPEG, PNG, WEBP '
+        'или GIF.',
+        code='unsupported_format',
+        params={'format': image_format},
+    )
+
+
+def strip_metadata(upload):
+    """
+    Перекодирует картинку без метаданных. Одновременно декодируется не
+    больше UPLOAD_MAX_CONCURRENT_DECODES картинок на процесс.
+    """
+    with _slots():
+        with Image.open(upload) as image:
+            if image.format not in REENCODE_FORMATS:
+                raise unsupported_format_error(image.format)
+            image_format, extension = REENCODE_FORMATS[image.format]
+            options = {}
+            if image_format == 'GIF':
+                # Поворот по EXIF оставил бы один кадр анимации.
+                options['save_all'] = True
+            else:
+                image = ImageOps.exif_transpose(image)
+            image.info = {key: value for key, value in image.info.items()
+                          if key in KEEP_INFO}
+            output = SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+            image.save(output, image_format, quality=90, **options)
+    output.seek(0, os.SEEK_END)
+    size = output.tell()
+    output.seek(0)
+    name = os.path.splitext(upload.name)[0]
+    return UploadedFile(
+        output, f'{name}.{extension}', Image.MIME[image_format], size)
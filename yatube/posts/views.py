@@ -1,97 +1,226 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
+from django.db.models import F
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
 
+from core.concurrent import gather
 
-from .models import Post, Group, User, Follow
+from .models import Comment, Post, Group, GroupStats, User, Follow
 from .forms import PostForm, CommentForm
+from .cache import (GLOBAL_SCOPE, GROUPS_SCOPE, author_scope,
+                    follow_feed_scope, group_scope, pending_comments_scope,
+                    post_scope)
+from .conditional import fragment_context, mark_stale, versioned_page
+from . import comment_queue, exporter, groups, thumbnails
+from .paginator import (COMMENT_ORDERING, NUM_OF_COMMENTS, NUM_OF_GROUPS,
+                        NUM_OF_POSTS, CursorPaginator, paginate)
+from .recompute import cached
+from .search import search as search_posts
+from .stats import stats_for
+from .timeline import follow_posts
+
+
+def _page_key(request):
+    return request.GET.get('cursor') or request.GET.get('page') or ''
+
+
+def _count(request, scope, queryset):
+    """COUNT(*) ленты для ?page=N: один пересчёт на версию области."""
+    fragment = fragment_context(request)
+    key = f"count:{scope}:{fragment['page_source']}"
+    return lambda: cached(key, queryset.count, fragment['fragment_timeout'],
+                          fragment['page_version'], name='feed_count',
+                          strict_version=True,
+                          on_stale=lambda: mark_stale(request))
+
+
+def _comments_page(post_id, cursor):
+    """
+    Страница комментариев с авторами одним запросом. Ленивая: если
+    фрагмент со списком уже в кеше, запроса не будет совсем.
+    """
+    def page():
+        comments = Comment.objects.filter(post_id=post_id).select_related(
+            'author').only('id', 'text', 'created', 'post_id',
+                           'author__id', 'author__username')
+        return CursorPaginator(comments, NUM_OF_COMMENTS,
+                               ordering=COMMENT_ORDERING).get_page(cursor)
+    return SimpleLazyObject(page)
+
 
-NUM_OF_POSTS = 10
+def _detail_scopes(post_id):
+    # Страница поста показывает и счётчик постов автора. Те же области у
+    # post_comments: фрагмент списка комментариев у них общий, и с
+    # разными версиями они перезаписывали бы его друг у друга.
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True).first()
+    if username is None:
+        # Поста нет: представление ответит 404.
+        return [post_scope(post_id)]
+    return [post_scope(post_id), author_scope(username)]
 
 
+@versioned_page(lambda: [GLOBAL_SCOPE])
 def index(request):
     template = 'posts/index.html'
     text = 'Последние изменения на сайте'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = paginate(request, posts,
+                        count=_count(request, GLOBAL_SCOPE, posts))
 
     context = {
         'text': text,
         'posts': posts,
         'page_obj': page_obj,
+        **fragment_context(request),
+        'feed_page': _page_key(request),
     }
     return render(request, template, context)
 
 
+def _group_count(slug):
+    """Число постов группы из GroupStats вместо COUNT(*) по постам."""
+    return lambda: GroupStats.objects.filter(group__slug=slug).values_list(
+        'posts_count', flat=True).first() or 0
+
+
+@versioned_page(lambda: [GROUPS_SCOPE])
+def group_index(request):
+    """Каталог групп: сначала с недавней активностью, и рейтинг."""
+    directory = Group.objects.select_related('stats').order_by(
+        F('stats__last_post_at').desc(nulls_last=True), 'title')
+    page_obj = Paginator(directory, NUM_OF_GROUPS).get_page(
+        request.GET.get('page'))
+    context = {
+        'page_obj': page_obj,
+        # Превью и рейтинг читаются, только если фрагмента нет в кеше.
+        'groups': SimpleLazyObject(
+            lambda: groups.with_previews(page_obj.object_list)),
+        'trending': groups.trending(),
+        **fragment_context(request),
+        'feed_page': _page_key(request),
+    }
+    return render(request, 'posts/group_index.html', context)
+
+
+@versioned_page(lambda slug: [group_scope(slug)])
 def group_posts(request, slug):
     template = 'posts/group_list.html'
 
-    group = get_object_or_404(Group, slug=slug)
-
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed().filter(group__slug=slug)
+    group, page_obj = gather(
+        lambda: get_object_or_404(Group, slug=slug),
+        lambda: paginate(request, posts, count=_group_count(slug)),
+    )
     context = {
         'group': group,
         'posts': posts,
         'page_obj': page_obj,
+        **fragment_context(request),
+        'feed_page': _page_key(request),
     }
     return render(request, template, context)
 
 
+@versioned_page(lambda username: [author_scope(username)])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
-    posts_count = posts.count()
-    following = (request.user.is_authenticated
-                 and Follow.objects.filter(user=request.user,
-                                           author=author).exists())
-    follower = author.follower.all()
-    count_follower = follower.count()
+    # Автор, подписка и страница постов не зависят друг от друга.
+    posts = Post.objects.for_feed().filter(author__username=username)
+    author, following, page_obj = gather(
+        lambda: get_object_or_404(User.objects.select_related('stats'),
+                                  username=username),
+        lambda: (request.user.is_authenticated
+                 and Follow.objects.filter(
+                     user=request.user, author__username=username).exists()),
+        lambda: paginate(request, posts, count=_count(
+            request, author_scope(username), posts)),
+    )
+    author_stats = stats_for(author)
     user = request.user.username
-    paginator = Paginator(posts, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     context = {
         'posts': posts,
         'author': author,
-        'posts_count': posts_count,
+        'posts_count': author_stats.posts_count,
         'page_obj': page_obj,
-        'count_follower': count_follower,
+        'count_follower': author_stats.followers_count,
         'following': following,
         'user': user,
+        **fragment_context(request),
+        'feed_page': _page_key(request),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def _pending_scopes(user, post_id):
+    # Свой комментарий из очереди меняет страницу только для автора.
+    if comment_queue.enabled() and user.is_authenticated:
+        return [pending_comments_scope(post_id, user.pk)]
+    return []
+
+
+@versioned_page(_detail_scopes, user_scopes=_pending_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group', 'author__stats'),
+        pk=post_id)
 
     author = post.author
-    posts_autor = Post.objects.filter(author=author)
-    posts_count = posts_autor.count()
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    # ?comments=<курсор> — следующие комментарии без JavaScript.
+    cursor = request.GET.get('comments')
     context = {
         'author': author,
         'post': post,
-        'posts_count': posts_count,
+        'posts_count': stats_for(author).posts_count,
         'form': form,
-        'comments': comments,
+        'comments': _comments_page(post.id, cursor),
+        'comments_cursor': cursor or '',
+        'pending_comments': comment_queue.pending_for(post.id, request.user),
+        **fragment_context(request),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@versioned_page(_detail_scopes)
+def post_comments(request, post_id):
+    """Следующая пачка комментариев: кусок HTML для кнопки «Ещё»."""
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    cursor = request.GET.get('cursor')
+    context = {
+        'post': post,
+        'comments': _comments_page(post.id, cursor),
+        'comments_cursor': cursor or '',
+        **fragment_context(request),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_posts(query) if query else []
+    page_obj = Paginator(results, NUM_OF_POSTS).get_page(
+        request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
     if form.is_valid():
         if request.user.is_authenticated:
             form.instance.author = request.user
-            form.save()
+            post = form.save()
+            thumbnails.schedule(post.image.name)
             return redirect('posts:profile', username=request.user)
     posts = Post.objects.all()
     context = {
@@ -110,7 +239,9 @@ def post_edit(request, post_id):
                     files=request.FILES or None,
                     instance=is_edit)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
         return redirect('posts:post_detail', post_id=is_edit.id)
     context = {
         'form': form,
@@ -125,7 +256,11 @@ def add_comment(request, post_id):
     # Получите пост и сохраните его в переменную post.
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and comment_queue.enabled():
+        # Запись пачкой в фоне; автор видит комментарий сразу.
+        comment_queue.enqueue(post.id, request.user,
+                              form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -134,14 +269,17 @@ def add_comment(request, post_id):
 
 
 @login_required
+@versioned_page(lambda user: [follow_feed_scope(user.id)], per_user=True)
 def follow_index(request):
-    post_list_follow = Post.objects.filter(
-        author__following__user=request.user)
-    paginator = Paginator(post_list_follow, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return render(request, 'posts/follow.html',
-                  {'page_obj': page_obj, 'paginator': paginator})
+    post_list_follow = follow_posts(request.user)
+    page_obj = paginate(request, post_list_follow)
+    context = {
+        'page_obj': page_obj,
+        'paginator': page_obj.paginator,
+        **fragment_context(request),
+        'feed_page': _page_key(request),
+    }
+    return render(request, 'posts/follow.html', context)
 
 
 @login_required
@@ -163,3 +301,24 @@ def profile_unfollow(request, username):
                                  user=request.user)
     follower.delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def export_content(request):
+    """Потоковая выгрузка контента: ?format=csv&kinds=posts,comments&since=."""
+    fmt = request.GET.get('format', 'ndjson')
+    kinds = request.GET.get('kinds', ','.join(exporter.KINDS)).split(',')
+    if fmt not in exporter.FORMATS or not set(kinds) <= set(exporter.KINDS):
+        return HttpResponseBadRequest('Неверный формат или вид записей')
+    try:
+        since = exporter.parse_since(request.GET.get('since'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        exporter.render(exporter.export_records(kinds, since), fmt),
+        content_type=exporter.CONTENT_TYPES[fmt],
+    )
+    extension = 'csv' if fmt == 'csv' else 'ndjson'
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-export.{extension}"')
+    return response
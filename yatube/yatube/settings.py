@@ -36,11 +36,15 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,13 +78,148 @@ TEMPLATES = [
     },
 ]
 
-CACHES = {
-    'default': {
+# Кеш: YATUBE_CACHE — locmem (свой у каждого процесса), file или sqlite
+# (общий для процессов одного сервера), redis (общий для нескольких
+# серверов, нужен пакет redis). Перед общим кешем стоит LRU в памяти
+# процесса (core.cache_backends.tiered); YATUBE_CACHE_LOCAL=0 его убирает.
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE', 'locmem')
+SHARED_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'core.cache_backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/0',
+    },
+}
+if CACHE_BACKEND == 'locmem':
+    DEFAULT_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
-}
+else:
+    DEFAULT_CACHE = dict(SHARED_CACHES[CACHE_BACKEND])
+    DEFAULT_CACHE['LOCATION'] = os.environ.get(
+        'YATUBE_CACHE_LOCATION', DEFAULT_CACHE['LOCATION'])
+    if os.environ.get('YATUBE_CACHE_LOCAL', '1') == '1':
+        DEFAULT_CACHE = {
+            'BACKEND': 'core.cache_backends.tiered.TieredCache',
+            'LOCATION': 'default',
+            'OPTIONS': {
+                'SHARED': DEFAULT_CACHE,
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 300,
+                # Версии областей (posts.cache), ждущие записи комментарии,
+                # фрагменты и счётчики лент (posts.recompute) с их замками
+                # читаются только из общего кеша: их изменения должны
+                # сразу видеть все процессы.
+                'SHARED_ONLY': ['version:', 'pending_comments:',
+                                'template.cache.', 'count:'],
+            },
+        }
+CACHES = {'default': DEFAULT_CACHE}
+
+# Фрагменты страниц лент и постов: в их ключах версии областей кеша
+# (posts.cache), поэтому запись сразу делает их устаревшими, а срок
+# жизни ограничивает лишь память кеша.
+FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('YATUBE_FRAGMENT_CACHE_TIMEOUT', 6 * 60 * 60))
+# Фрагменты, отрисованные по данным реплики, живут не дольше её отставания.
+REPLICA_FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('YATUBE_REPLICA_FRAGMENT_CACHE_TIMEOUT', 10))
+# Отложенная запись комментариев (posts.comment_queue): 'off' — сразу в
+# запросе, 'memory' — очередь в памяти процесса, 'sqlite' — очередь в
+# файле COMMENT_QUEUE_PATH. Пачки до COMMENT_BATCH_SIZE пишутся не реже
+# раза в COMMENT_FLUSH_INTERVAL секунд. Комментарий, который не записался
+# COMMENT_MAX_ATTEMPTS раз, откладывается из очереди.
+COMMENT_WRITE_BEHIND = os.environ.get('YATUBE_COMMENT_WRITE_BEHIND', 'off')
+COMMENT_QUEUE_PATH = os.environ.get(
+    'YATUBE_COMMENT_QUEUE_PATH', os.path.join(BASE_DIR, 'comments.sqlite3'))
+COMMENT_BATCH_SIZE = 500
+COMMENT_FLUSH_INTERVAL = 0.5
+COMMENT_FLUSH_THREAD = True
+COMMENT_OVERLAY_TIMEOUT = 300
+COMMENT_MAX_ATTEMPTS = 5
+# Пересчёт фрагментов и счётчиков (posts.recompute): пока один запрос
+# пересчитывает значение, остальные получают прежнее, если оно моложе
+# срока на STAMPEDE_STALE_SECONDS, или ждут до STAMPEDE_LOCK_WAIT секунд.
+# STAMPEDE_BETA > 1 начинает пересчёт раньше срока охотнее.
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_LOCK_WAIT = 2
+STAMPEDE_STALE_SECONDS = 60
+STAMPEDE_BETA = 1.0
+# Сколько секунд прокси и браузер могут отдавать гостям страницы лент
+# без перепроверки (ETag всё равно ставится).
+ANONYMOUS_CACHE_SECONDS = int(
+    os.environ.get('YATUBE_ANONYMOUS_CACHE_SECONDS', 10))
+
+# Лента подписок: 'pull' — запрос через Follow, 'push' — материализованные
+# TimelineEntry, 'hybrid' — push, но популярные авторы остаются в pull.
+TIMELINE_MODE = os.environ.get('YATUBE_TIMELINE_MODE', 'pull')
+TIMELINE_CELEBRITY_FOLLOWERS = 10000
+TIMELINE_BACKFILL_SIZE = 1000
+TIMELINE_BATCH_SIZE = 500
+
+# Миниатюры картинок строит фоновая задача после сохранения поста.
+# THUMBNAIL_ASYNC = False строит их сразу, в том же запросе; так по
+# умолчанию при DEBUG.
+THUMBNAIL_ASYNC = os.environ.get(
+    'YATUBE_THUMBNAIL_ASYNC', '0' if DEBUG else '1') == '1'
+# Сколько секунд страница не ставит недостающую миниатюру в очередь
+# повторно: задача уже есть или упала, новая вставка Job бесполезна.
+THUMBNAIL_RETRY_SECONDS = 300
+
+# Загрузки: файл сверх UPLOAD_MAX_BYTES отбрасывается ещё при приёме,
+# картинка больше UPLOAD_MAX_PIXELS отклоняется по заголовку.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_BYTES = 5 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 25000000
+UPLOAD_MAX_CONCURRENT_DECODES = 2
+
+# Фоновые задачи (jobs): их выполняет manage.py run_workers. При
+# TASKS_SYNC задача выполняется сразу в запросе; так по умолчанию при
+# DEBUG, чтобы разработке и тестам не нужен был воркер.
+TASKS_SYNC = os.environ.get('YATUBE_TASKS_SYNC', '1' if DEBUG else '0') == '1'
+TASK_WORKER_THREADS = int(os.environ.get('YATUBE_TASK_WORKER_THREADS', 4))
+TASK_BATCH_SIZE = 20
+TASK_POLL_SECONDS = 1.0
+TASK_MAX_ATTEMPTS = 5
+TASK_BACKOFF_SECONDS = 2
+TASK_BACKOFF_MAX = 3600
+# Столько секунд задача числится за воркером; потом её заберёт другой.
+TASK_LEASE_SECONDS = 300
+TASK_RETENTION_DAYS = 7
+
+# Рейтинг групп (posts.groups): посты и комментарии за окно, вклад
+# вдвое слабеет за период полураспада. Пересчёт — раз в
+# TRENDING_INTERVAL секунд периодической задачей воркеров.
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_COMMENT_WEIGHT = 0.25
+TRENDING_INTERVAL = int(os.environ.get('YATUBE_TRENDING_INTERVAL', 600))
+TRENDING_SIZE = 10
+
+# Метрики запросов (/metrics/): собираются для доли запросов
+# METRICS_SAMPLE_RATE; без входа в админку их отдают по заголовку
+# Authorization: Bearer <METRICS_TOKEN>.
+METRICS_ENABLED = os.environ.get('YATUBE_METRICS_ENABLED', '1') == '1'
+METRICS_SAMPLE_RATE = float(os.environ.get('YATUBE_METRICS_SAMPLE_RATE', 0.1))
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# yatube.asgi: запросы выполняются в пуле из ASGI_THREADS потоков, пока
+# цикл событий сервера принимает новые соединения.
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 20))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -89,11 +228,90 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# YATUBE_DB_ENGINE: sqlite (по умолчанию) или postgresql.
+# Соединения держатся CONN_MAX_AGE секунд, а не открываются на каждый запрос.
+DB_ENGINE = os.environ.get('YATUBE_DB_ENGINE', 'sqlite')
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 60))
+
+# Независимые запросы страниц профиля и группы — в параллельных потоках
+# (core.concurrent). Имеет смысл для сетевой базы, по умолчанию — при
+# PostgreSQL.
+VIEW_CONCURRENT_LOOKUPS = os.environ.get(
+    'YATUBE_CONCURRENT_LOOKUPS', '1' if DB_ENGINE == 'postgresql' else '0'
+) == '1'
+VIEW_LOOKUP_THREADS = int(os.environ.get('YATUBE_LOOKUP_THREADS', 16))
+
+if DB_ENGINE == 'postgresql':
+    # YATUBE_DB_POOL: none — свои соединения у каждого потока;
+    # internal — пул psycopg2 в процессе (core.backends.postgresql_pool);
+    # pgbouncer — внешний пулер в режиме transaction.
+    DB_POOL = os.environ.get('YATUBE_DB_POOL', 'none')
+    DATABASES = {
+        'default': {
+            'ENGINE': ('core.backends.postgresql_pool' if DB_POOL == 'internal'
+                       else 'django.db.backends.postgresql'),
+            'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+            'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+            'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('YATUBE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+            # Из пула соединение берётся на запрос и сразу возвращается.
+            'CONN_MAX_AGE': 0 if DB_POOL == 'internal' else CONN_MAX_AGE,
+            'POOL_MIN_SIZE': int(os.environ.get('YATUBE_DB_POOL_MIN', 1)),
+            # Соединение может держать каждый поток ASGI и каждый поток
+            # параллельных запросов; сверх размера пула поток ждёт
+            # POOL_TIMEOUT секунд.
+            'POOL_MAX_SIZE': int(os.environ.get(
+                'YATUBE_DB_POOL_MAX', ASGI_THREADS + VIEW_LOOKUP_THREADS)),
+            'POOL_TIMEOUT': float(os.environ.get('YATUBE_DB_POOL_TIMEOUT',
+                                                 10)),
+            # Серверные курсоры не переживают смену соединения в pgbouncer.
+            'DISABLE_SERVER_SIDE_CURSORS': DB_POOL == 'pgbouncer',
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get(
+                'YATUBE_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+        }
+    }
+
+# Поиск по постам: SQLite FTS5, а в PostgreSQL, где миграция не создаёт
+# таблицу FTS5, — запасной вариант на LIKE.
+SEARCH_BACKEND = ('posts.search.DatabaseSearchBackend'
+                  if DB_ENGINE == 'postgresql'
+                  else 'posts.search.SqliteFTSBackend')
+
+# Реплики для чтения: YATUBE_DB_REPLICAS — пути к копиям SQLite или
+# хосты PostgreSQL через запятую. Запись всегда идёт в default.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')),
+        1):
+    alias = 'replica' if number == 1 else f'replica{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        **{'NAME' if DB_ENGINE == 'sqlite' else 'HOST': replica.strip()},
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы.
+PRIMARY_PIN_SECONDS = int(os.environ.get('YATUBE_PRIMARY_PIN_SECONDS', 10))
+
+# PRAGMA для каждого нового соединения SQLite (core.db): WAL пускает
+# читателей параллельно с писателем, synchronous=NORMAL в WAL безопасен
+# и не ждёт fsync на каждый коммит, busy_timeout (мс) — сколько ждать
+# блокировку записи, прежде чем упасть с «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('YATUBE_SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
+    'busy_timeout': int(os.environ.get('YATUBE_SQLITE_BUSY_TIMEOUT', 20000)),
+    'mmap_size': int(os.environ.get('YATUBE_SQLITE_MMAP_SIZE', 268435456)),
+    'temp_store': 'memory',
 }
 
 